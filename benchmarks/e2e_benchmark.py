@@ -0,0 +1,161 @@
+"""
+Offline end-to-end benchmark of the whole bot
+
+Starts the stand-in services (synthetic feeds, article pages, OpenAI and the Telegram Bot API, see stand_ins) and runs
+the unchanged monitor_feed against them in a fresh worker process per feed count, with its own Postgres schema that is
+dropped afterwards. Reports per feed count the articles per second that left the pipeline (published or skipped),
+the posts sent, the p50/p99 latency from an entry appearing in its feed to its post arriving at the Bot API, and the
+peak RSS of the bot process (the parser processes not included). Only the database is real: DATABASE_URL must point
+at a Postgres the benchmark may create schemas in, e.g. a local one, and tiktoken needs its encoding in its cache
+(TIKTOKEN_CACHE_DIR), as it is downloaded on first use.
+
+Usage: DATABASE_URL=postgresql://... python -m benchmarks.e2e_benchmark [--feeds 10,100,1000] [--seconds 60] ...
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+from urllib.parse import quote, urlsplit
+
+import psycopg2
+
+from benchmarks.stand_ins import StandIns
+from core import PROJECT_ROOT
+
+BOT_TOKEN = "123456:benchmark"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--feeds", default="10,100,1000", help="comma separated feed counts, one run each")
+    parser.add_argument("--seconds", type=float, default=60, help="seconds until the stop, init included")
+    parser.add_argument("--poll-interval", type=float, default=5, help="seconds between two polls of a feed")
+    parser.add_argument("--entries-per-minute", type=float, default=1, help="new entries per feed and minute")
+    parser.add_argument("--page-kb", default="5,200", help="min,max size of the article pages in KB")
+    parser.add_argument("--relevant", type=float, default=0.5, help="share of the articles related to AI")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="average seconds of an LLM answer")
+    parser.add_argument("--llm-429", type=float, default=0.0, help="share of the LLM requests answered with 429")
+    parser.add_argument("--llm-rpm", type=int, default=100000, help="LLM_RPM budget of the governor")
+    parser.add_argument("--llm-tpm", type=int, default=100000000, help="LLM_TPM budget of the governor")
+    parser.add_argument("--broken", type=float, default=0.0, help="share of the feeds answering 503 after a delay")
+    parser.add_argument("--broken-delay", type=float, default=10, help="seconds before a broken feed answers")
+    parser.add_argument("--telegram-latency", type=float, default=0.02, help="seconds of a Bot API send")
+    parser.add_argument("--telegram-limits", action="store_true", help="keep the 20 posts a minute channel limit")
+    parser.add_argument("--log-dir", help="keep the feed lists and worker logs here instead of a temp directory")
+    return parser.parse_args()
+
+
+def schema_url(database_url: str, schema: str) -> str:
+    """The database URL with the schema as the search path of every connection"""
+    separator = "&" if urlsplit(database_url).query else "?"
+    return f"{database_url}{separator}options={quote(f'-c search_path={schema}')}"
+
+
+def run_sql(database_url: str, sql: str) -> None:
+    connection = psycopg2.connect(database_url, sslmode=os.environ.get("DATABASE_SSLMODE", "require"))
+    try:
+        with connection, connection.cursor() as cursor:
+            cursor.execute(sql)
+    finally:
+        connection.close()
+
+
+def worker_environment(args: argparse.Namespace, stand_ins: StandIns, schema: str) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(PROJECT_ROOT), os.environ.get("PYTHONPATH")])),
+        "DATABASE_URL": schema_url(os.environ["DATABASE_URL"], schema),
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_API_BASE": f"{stand_ins.base_url}/v1",
+        "BOT_TOKEN": BOT_TOKEN,
+        "LLM_RPM": str(args.llm_rpm),
+        "LLM_TPM": str(args.llm_tpm),
+        "FEED_SHARDING": "0",
+        "METRICS_PORT": "0",
+    }
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else float("nan")
+
+
+async def run(args: argparse.Namespace, stand_ins: StandIns, feeds: int, directory: Path) -> Dict[str, Any]:
+    """Run the bot against `feeds` stand-in feeds and return its measurements"""
+    schema = f"e2e_benchmark_{os.getpid()}_{feeds}"
+    await asyncio.to_thread(run_sql, os.environ["DATABASE_URL"], f"CREATE SCHEMA {schema}")
+    try:
+        stand_ins.reset(feeds)
+        feeds_file = directory / f"feeds_{feeds}.json"
+        feeds_file.write_text(json.dumps({url: f"Feed {number}" for number, url in enumerate(stand_ins.feed_urls())}))
+        log_file = directory / f"worker_{feeds}.log"
+        with open(log_file, "w") as log:
+            worker = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "benchmarks.e2e_worker", os.path.abspath(feeds_file), str(args.seconds),
+                str(args.poll_interval), f"{stand_ins.base_url}/bot", "1" if args.telegram_limits else "0",
+                stdout=asyncio.subprocess.PIPE, stderr=log, env=worker_environment(args, stand_ins, schema),
+                cwd=directory,  # The bot writes its error log to logs/ in the working directory
+            )
+            output, _ = await worker.communicate()
+        if worker.returncode != 0:
+            tail = "".join(log_file.read_text().splitlines(keepends=True)[-20:])
+            raise RuntimeError(f"The worker for {feeds} feeds failed:\n{tail}")
+        result = json.loads(output.decode().strip().splitlines()[-1])
+    finally:
+        await asyncio.to_thread(run_sql, os.environ["DATABASE_URL"], f"DROP SCHEMA {schema} CASCADE")
+
+    now = time.time()
+    finished = sum(result["outcomes"].values())
+    return {
+        "feeds": feeds,
+        "new entries": stand_ins.published_entries(now - result["monitor_seconds"], now),
+        "finished": finished,
+        "articles/s": finished / result["monitor_seconds"] if result["monitor_seconds"] else 0.0,
+        "posts": len(stand_ins.latencies),
+        "p50 s": percentile(stand_ins.latencies, 0.5),
+        "p99 s": percentile(stand_ins.latencies, 0.99),
+        "init s": result["init_seconds"],
+        "drain s": result["drain_seconds"],
+        "peak RSS MB": result["peak_rss_kb"] / 1024,
+        "failed": result["outcomes"].get("failed", 0),
+        "requests": dict(stand_ins.requests),
+    }
+
+
+async def main() -> None:
+    args = parse_args()
+    if not os.environ.get("DATABASE_URL"):
+        sys.exit("DATABASE_URL must point at a Postgres the benchmark may create schemas in")
+    low, high = (int(size) for size in args.page_kb.split(","))
+    stand_ins = StandIns(entries_per_minute=args.entries_per_minute, page_kb=(low, high), relevant=args.relevant,
+                         llm_latency=args.llm_latency, llm_rate_limited=args.llm_429,
+                         telegram_latency=args.telegram_latency, broken=args.broken, broken_delay=args.broken_delay)
+    runner = await stand_ins.start()
+    columns = ["feeds", "new entries", "finished", "articles/s", "posts", "p50 s", "p99 s", "init s", "drain s",
+               "peak RSS MB", "failed"]
+    try:
+        with tempfile.TemporaryDirectory(prefix="e2e_benchmark_") as directory:
+            directory = os.path.abspath(args.log_dir or directory)  # The worker runs in it, see run()
+            os.makedirs(directory, exist_ok=True)
+            print(f"Stand-ins on {stand_ins.base_url}, {args.seconds:.0f}s per run, polls every "
+                  f"{args.poll_interval:.0f}s, {args.entries_per_minute:g} entries per feed and minute")
+            print(" ".join(f"{column:>12}" for column in columns))
+            for feeds in (int(count) for count in args.feeds.split(",")):
+                result = await run(args, stand_ins, feeds, Path(directory))
+                print(" ".join(
+                    f"{result[column]:>12.2f}" if isinstance(result[column], float) else f"{result[column]:>12}"
+                    for column in columns
+                ))
+                print(f"{'':>12} requests: {result['requests']}")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
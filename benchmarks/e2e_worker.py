@@ -0,0 +1,71 @@
+"""
+One run of the bot against the stand-in services, started by e2e_benchmark in a fresh process
+
+The environment points the database, OpenAI and the bot token at the stand-ins (see e2e_benchmark.worker_environment).
+The worker polls the feeds of FEEDS_FILE every POLL_INTERVAL seconds with the unchanged monitor_feed, asks it to stop
+after SECONDS like SIGTERM does, and prints the pipeline outcomes, the initialization and drain times and its peak RSS
+as one JSON line.
+
+Usage: python -m benchmarks.e2e_worker FEEDS_FILE SECONDS POLL_INTERVAL BOT_API_URL TELEGRAM_LIMITS(0/1)
+"""
+
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+
+from telegram.ext import AIORateLimiter, ExtBot
+
+from core.metrics import metrics
+from core.supervisor import Supervisor
+from tg.handlers import logic
+from tg.handlers.parsing import parser_pool
+from tg.handlers.registry import FeedRegistry
+from tg.handlers.scheduler import FeedScheduler
+
+
+async def main() -> None:
+    feeds_file, seconds, poll_interval, bot_api_url, telegram_limits = sys.argv[1:6]
+    poll_interval = float(poll_interval)
+    logic.feed_registry = FeedRegistry(Path(feeds_file))
+    logic.feed_scheduler = FeedScheduler(min_interval=poll_interval, max_interval=poll_interval,
+                                         default_interval=poll_interval)
+    # Without the limits of the channel (20 posts a minute) the publisher is measured, not Telegram's flood control
+    logic.telegram_publisher.bot = ExtBot(token=os.environ["BOT_TOKEN"], base_url=bot_api_url,
+                                          rate_limiter=AIORateLimiter() if telegram_limits == "1" else None)
+
+    started = time.perf_counter()
+    initialized = {}
+    initialize_feeds = logic.initialize_feeds
+
+    async def timed_initialize_feeds():
+        await initialize_feeds()
+        initialized["at"] = time.perf_counter()
+
+    logic.initialize_feeds = timed_initialize_feeds
+    supervisor = Supervisor()
+    stop = asyncio.get_running_loop().call_later(float(seconds), supervisor.request_stop)
+    try:
+        await logic.monitor_feed(supervisor)
+    finally:
+        stop.cancel()
+        await supervisor.stop()
+        parser_pool.shutdown()
+    stopped = time.perf_counter()
+
+    outcomes = metrics.get("pipeline_items_total")
+    ready = initialized.get("at", stopped)
+    print(json.dumps({
+        "init_seconds": ready - started,
+        "monitor_seconds": stopped - ready,
+        "drain_seconds": max(stopped - started - float(seconds), 0.0),
+        "outcomes": {dict(labels)["outcome"]: value for labels, value in outcomes.values.items()},
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }), flush=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+Benchmark of the article extractor against the previous BeautifulSoup implementation
+
+Both extract the largest text block and the lead image of every page. CPU time is measured with perf_counter and peak
+memory with tracemalloc, each in a separate pass. Pages are read from a directory of saved .html files, or generated
+when no directory is given.
+
+Usage: python -m benchmarks.extractor_benchmark [directory/with/saved/pages]
+"""
+
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+from tg.parsers import extract_from_html
+
+REPEAT = 5
+
+
+def extract_with_beautifulsoup(page: str) -> Tuple[str, Optional[str]]:
+    """The previous implementation: full html.parser tree and string concatenation"""
+    soup = BeautifulSoup(page, 'html.parser')
+    paragraphs = soup.find_all('p')
+    largest_block = ""
+    current_block = ""
+    for paragraph in paragraphs:
+        if len(paragraph.text) > 50:
+            current_block += paragraph.text + "\n"
+        else:
+            if len(current_block) > len(largest_block):
+                largest_block = current_block
+            current_block = ""
+    image_div = soup.find('figure', {'class': 'article__lead__image'})
+    image_url = image_div.find('img')['src'] if image_div else None
+    return largest_block.strip(), image_url
+
+
+def generate_page(paragraphs: int) -> str:
+    """A news page with navigation, scripts, a lead image and `paragraphs` paragraphs of article text"""
+    body = "".join(
+        f"<p>Paragraph {number} of the article about a new language model, long enough to count as body text.</p>"
+        if number % 25 else "<p>Advertisement</p>"
+        for number in range(paragraphs)
+    )
+    return (
+        "<html><head><meta property='og:image' content='https://example.com/lead.jpg'>"
+        "<script>var tracking = {};</script><style>p { color: black; }</style></head><body>"
+        + "<nav>" + "<a href='/'>Section</a>" * 200 + "</nav>"
+        + "<figure class='article__lead__image'><img src='https://example.com/lead.jpg'></figure>"
+        + f"<article>{body}</article><footer><p>Copyright</p></footer></body></html>"
+    )
+
+
+def load_pages(directory: Optional[str]) -> Dict[str, str]:
+    if directory:
+        return {path.name: path.read_text(encoding="utf-8", errors="replace")
+                for path in sorted(Path(directory).glob("*.html"))}
+    return {f"generated-{count}p": generate_page(count) for count in (50, 500, 5000)}
+
+
+def measure(extract: Callable[[str], Tuple[str, Optional[str]]], page: str) -> Tuple[float, float]:
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        extract(page)
+    elapsed_ms = (time.perf_counter() - started) / REPEAT * 1000
+
+    tracemalloc.start()
+    extract(page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed_ms, peak / 1024 / 1024
+
+
+def main() -> None:
+    pages = load_pages(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"{'page':<24} {'size KB':>8} {'bs4 ms':>9} {'new ms':>9} {'bs4 MB':>8} {'new MB':>8} {'same text':>10}")
+    rows: List[str] = []
+    for name, page in pages.items():
+        old_ms, old_mb = measure(extract_with_beautifulsoup, page)
+        new_ms, new_mb = measure(extract_from_html, page)
+        same_text = extract_with_beautifulsoup(page)[0] == extract_from_html(page)[0]
+        rows.append(f"{name:<24} {len(page) / 1024:>8.0f} {old_ms:>9.1f} {new_ms:>9.1f} {old_mb:>8.1f} {new_mb:>8.1f} "
+                    f"{str(same_text):>10}")
+    print("\n".join(rows))
+
+
+if __name__ == "__main__":
+    main()
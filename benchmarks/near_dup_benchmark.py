@@ -0,0 +1,69 @@
+"""
+Benchmark of the near-duplicate index
+
+Fills the in-memory index with synthetic stories and measures the fingerprinting, insert and query cost, together with
+the detection rate of lightly edited copies and the false positive rate of unrelated stories.
+
+Usage: python -m benchmarks.near_dup_benchmark [stored articles, default 100000]
+"""
+
+import random
+import sys
+import time
+
+from tg.handlers.near_dup import NearDuplicateIndex, simhash
+
+VOCABULARY = [f"word{number}" for number in range(5000)]
+QUERIES = 2000
+
+
+def random_story(rng: random.Random) -> tuple:
+    title = " ".join(rng.choices(VOCABULARY, k=10))
+    content = " ".join(rng.choices(VOCABULARY, k=150))
+    return title, content
+
+
+def edited_copy(rng: random.Random, title: str, content: str) -> tuple:
+    """A re-syndicated copy: same title, a few words of the lead replaced"""
+    words = content.split()
+    for position in rng.sample(range(len(words)), 3):
+        words[position] = rng.choice(VOCABULARY)
+    return title, " ".join(words)
+
+
+def main() -> None:
+    stored = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(42)
+    index = NearDuplicateIndex()
+    now = time.time()
+
+    stories = [random_story(rng) for _ in range(QUERIES)]
+    started = time.perf_counter()
+    fingerprints = [simhash(title, content) for title, content in stories]
+    fingerprint_us = (time.perf_counter() - started) / QUERIES * 1e6
+
+    for number, fingerprint in enumerate(fingerprints):
+        index.add(f"story-{number}", fingerprint, now)
+    filler = [rng.getrandbits(64) for _ in range(stored - QUERIES)]  # Random fingerprints of unrelated stories
+    started = time.perf_counter()
+    for number, fingerprint in enumerate(filler):
+        index.add(f"filler-{number}", fingerprint, now)
+    insert_us = (time.perf_counter() - started) / max(len(filler), 1) * 1e6
+
+    copies = [simhash(*edited_copy(rng, title, content)) for title, content in stories]
+    unrelated = [simhash(*random_story(rng)) for _ in range(QUERIES)]
+    started = time.perf_counter()
+    detected = sum(index.find(fingerprint, now) is not None for fingerprint in copies)
+    false_positives = sum(index.find(fingerprint, now) is not None for fingerprint in unrelated)
+    query_us = (time.perf_counter() - started) / (2 * QUERIES) * 1e6
+
+    print(f"stored articles:     {len(index)}")
+    print(f"fingerprint:         {fingerprint_us:.1f} us/article")
+    print(f"insert:              {insert_us:.1f} us/article")
+    print(f"query:               {query_us:.1f} us/article")
+    print(f"edited copies found: {detected / QUERIES:.1%}")
+    print(f"false positives:     {false_positives / QUERIES:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark of the parser pool against parsing on the event loop
+
+Parses N large article pages and one large feed concurrently, the way a busy polling cycle does, once on the event
+loop itself (the previous behaviour), once in a thread and once in the process pool. Reports the cycle time and the
+event-loop lag: how late a ticker task that wants to run every 10 ms actually runs, i.e. how long every download, LLM
+call or send would have been stalled.
+
+Usage: python -m benchmarks.parsing_benchmark [concurrent pages, default 16]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+from typing import Any, Callable, List, Tuple
+
+from benchmarks.extractor_benchmark import generate_page
+from tg.handlers.parsing import ParserPool
+from tg.parsers import extract_page, parse_feed
+
+TICK = 0.01
+PAGE_PARAGRAPHS = 5000
+FEED_ENTRIES = 500
+
+Job = Tuple[Callable[..., Any], tuple]  # A parsing function and its arguments
+
+
+def generate_feed(entries: int) -> bytes:
+    items = "".join(
+        f"<item><title>Story {number} about a new model</title><link>https://example.com/{number}</link>"
+        f"<guid>https://example.com/{number}</guid><pubDate>Mon, 06 Nov 2023 {number % 24:02d}:00:00 +0000</pubDate>"
+        f"<description>{'Summary of the story. ' * 20}</description></item>"
+        for number in range(entries)
+    )
+    return f"<?xml version='1.0'?><rss version='2.0'><channel><title>Feed</title>{items}</channel></rss>".encode()
+
+
+async def measure_lag(stop: asyncio.Event, lags: List[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+async def run_cycle(parse: Callable[..., Any], jobs: List[Job]) -> Tuple[float, List[float]]:
+    stop, lags = asyncio.Event(), []
+    ticker = asyncio.create_task(measure_lag(stop, lags))
+    await asyncio.sleep(TICK * 2)
+    started = time.perf_counter()
+    await asyncio.gather(*(parse(function, *args) for function, args in jobs))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    return elapsed, lags
+
+
+async def on_loop(function: Callable[..., Any], *args: Any) -> Any:
+    await asyncio.sleep(0)  # The download that precedes the parsing
+    return function(*args)
+
+
+async def in_thread(function: Callable[..., Any], *args: Any) -> Any:
+    await asyncio.sleep(0)
+    return await asyncio.to_thread(function, *args)
+
+
+async def main() -> None:
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    page = generate_page(PAGE_PARAGRAPHS).encode()
+    feed = generate_feed(FEED_ENTRIES)
+    jobs = [(extract_page, (page, "utf-8"))] * pages + [(parse_feed, (feed, {}))]
+    print(f"{pages} pages of {len(page) / 1024:.0f} KB and a feed of {FEED_ENTRIES} entries "
+          f"({len(feed) / 1024:.0f} KB), parsed concurrently")
+
+    pool = ParserPool()
+    await pool.run(len, b"")  # Start the worker processes before measuring
+    modes = [("event loop", on_loop), ("thread", in_thread), (f"process pool ({pool.workers})", pool.run)]
+    print(f"{'mode':<20} {'cycle s':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+    for name, parse in modes:
+        elapsed, lags = await run_cycle(parse, jobs)
+        lags_ms = sorted(lag * 1000 for lag in lags)
+        p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+        print(f"{name:<20} {elapsed:>8.2f} {statistics.median(lags_ms):>11.1f} {p99:>11.1f} {lags_ms[-1]:>11.1f}")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,216 @@
+"""
+Local stand-ins for the services the bot talks to
+
+One aiohttp application serves synthetic RSS feeds, the article pages they link to, the OpenAI ChatCompletion endpoint
+and the Telegram Bot API, so a whole polling cycle runs offline. Every feed publishes a new entry at a fixed rate from
+the start of the run. The time an entry appears follows from its feed and number, so the Bot API stand-in measures the
+end-to-end latency of every post from the link in its caption. The LLM and Bot API answers can be delayed, a share
+of the LLM requests can be answered with 429, and a share of the feeds can be broken: they answer 503 after a delay.
+"""
+
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from email.utils import formatdate
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+FEED_ENTRIES = 20  # Newest entries listed in a feed
+BACKLOG = 5  # Entries every feed already has when the run starts
+WORDS = (
+    "market city council report weather season team player budget school river station museum festival road "
+    "company product launch price growth quarter energy climate policy election court health study travel food "
+    "music film book garden harbour bridge village mountain coast library hospital airport railway factory"
+).split()
+AI_WORDS = (
+    "model neural network training inference dataset benchmark transformer agent reasoning robotics vision "
+    "language alignment fine-tuning GPU parameters open-source"
+).split()
+SUMMARY = (
+    "The team behind the release says the new system is faster and cheaper to run. <b>Early benchmarks</b> look "
+    "promising, although independent tests are still missing. As always, the devil is in the details."
+)
+ENTRY_PATTERN = re.compile(r"/articles/(\d+)/(-?\d+)")
+BATCH_TITLE_PATTERN = re.compile(r"Article (\d+)\. Title: (.*?)\. Content:")
+
+
+class StandIns:
+    """State and handlers of the stand-in services for one run"""
+
+    def __init__(self, entries_per_minute: float = 1.0, page_kb: Tuple[int, int] = (5, 200), relevant: float = 0.5,
+                 llm_latency: float = 0.2, llm_rate_limited: float = 0.0, telegram_latency: float = 0.02,
+                 broken: float = 0.0, broken_delay: float = 10.0) -> None:
+        self.interval = 60.0 / entries_per_minute
+        self.page_kb = page_kb
+        self.relevant = relevant
+        self.llm_latency = llm_latency
+        self.llm_rate_limited = llm_rate_limited
+        self.telegram_latency = telegram_latency
+        self.broken = broken
+        self.broken_delay = broken_delay
+        self.base_url = ""
+        self.reset(0)
+
+    def reset(self, feeds: int) -> None:
+        """Start a new run with `feeds` feeds, all counters at zero"""
+        self.feeds = feeds
+        self.started = time.time()
+        self.latencies: List[float] = []
+        self.requests: Dict[str, int] = {"feed": 0, "not modified": 0, "broken": 0, "page": 0, "llm": 0, "llm 429": 0,
+                                         "send": 0}
+        self._message_ids = 0
+
+    def feed_urls(self) -> List[str]:
+        return [f"{self.base_url}/feeds/{feed}.xml" for feed in range(self.feeds)]
+
+    def _entry_time(self, feed: int, number: int) -> float:
+        # The feeds are staggered, so their entries do not all appear at the same moment
+        return self.started + self.interval * (number + feed / max(self.feeds, 1))
+
+    def _latest_entry(self, feed: int, now: float) -> int:
+        return math.floor((now - self.started) / self.interval - feed / max(self.feeds, 1))
+
+    def is_broken(self, feed: int) -> bool:
+        return feed < round(self.feeds * self.broken)
+
+    def published_entries(self, since: float, until: float) -> int:
+        """Number of entries that appeared in the working feeds between the two times"""
+        return sum(
+            max(self._latest_entry(feed, until) - self._latest_entry(feed, since), 0)
+            for feed in range(self.feeds) if not self.is_broken(feed)
+        )
+
+    def _is_relevant(self, feed: int, number: int) -> bool:
+        return random.Random(f"relevant {feed}/{number}").random() < self.relevant
+
+    def _title(self, feed: int, number: int) -> str:
+        rng = random.Random(f"title {feed}/{number}")
+        if self._is_relevant(feed, number):
+            return f"AI story {feed}-{number}: new {' '.join(rng.sample(AI_WORDS, 3))} results"
+        return f"Local story {feed}-{number}: {' '.join(rng.sample(WORDS, 4))}"
+
+    async def feed(self, request: web.Request) -> web.Response:
+        self.requests["feed"] += 1
+        feed = int(request.match_info["feed"])
+        if self.is_broken(feed):
+            self.requests["broken"] += 1
+            await asyncio.sleep(self.broken_delay)
+            return web.Response(status=503, text="Service Unavailable")
+        latest = self._latest_entry(feed, time.time())
+        etag = f'"{feed}-{latest}"'
+        if request.headers.get("If-None-Match") == etag:
+            self.requests["not modified"] += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        items = "".join(
+            f"<item><title>{self._title(feed, number)}</title>"
+            f"<link>{self.base_url}/articles/{feed}/{number}</link><guid>{feed}/{number}</guid>"
+            f"<pubDate>{formatdate(self._entry_time(feed, number), usegmt=True)}</pubDate></item>"
+            for number in range(latest, max(latest - FEED_ENTRIES, -BACKLOG - 1), -1)
+        )
+        body = f"<?xml version='1.0'?><rss version='2.0'><channel><title>Feed {feed}</title>{items}</channel></rss>"
+        return web.Response(text=body, content_type="application/rss+xml", headers={"ETag": etag})
+
+    async def article(self, request: web.Request) -> web.Response:
+        self.requests["page"] += 1
+        feed, number = int(request.match_info["feed"]), int(request.match_info["number"])
+        rng = random.Random(f"page {feed}/{number}")
+        words = WORDS + AI_WORDS if self._is_relevant(feed, number) else WORDS
+        target = rng.randint(*self.page_kb) * 1024
+        paragraphs, size = [], 0
+        while size < target:
+            paragraph = f"<p>{' '.join(rng.choices(words, k=rng.randint(30, 80))).capitalize()}.</p>"
+            paragraphs.append(paragraph)
+            size += len(paragraph)
+        body = (
+            f"<html><head><title>{self._title(feed, number)}</title>"
+            f"<meta property='og:image' content='/images/{feed}/{number}.jpg'></head><body>"
+            + "<nav>" + "<a href='/'>Section</a>" * 50 + "</nav>"
+            + f"<article>{''.join(paragraphs)}</article><footer><p>Copyright</p></footer></body></html>"
+        )
+        return web.Response(text=body, content_type="text/html")
+
+    def _answer(self, messages: List[Dict[str, str]]) -> str:
+        system, prompt = messages[0]["content"], messages[-1]["content"]
+        if "filter bot" not in system:
+            return SUMMARY
+        if "numbered articles" in system:
+            titles = BATCH_TITLE_PATTERN.findall(prompt)
+            return json.dumps({number: title.startswith("AI ") for number, title in titles})
+        return "True" if prompt.startswith("Article Title: AI ") else "False"
+
+    async def chat_completion(self, request: web.Request) -> web.Response:
+        self.requests["llm"] += 1
+        data = await request.json()
+        await asyncio.sleep(self.llm_latency * random.uniform(0.5, 1.5))
+        if random.random() < self.llm_rate_limited:
+            self.requests["llm 429"] += 1
+            error = {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+            return web.json_response(error, status=429, headers={"Retry-After": "1"})
+        answer = self._answer(data["messages"])
+        prompt_tokens = sum(len(message["content"]) for message in data["messages"]) // 4
+        return web.json_response({
+            "id": f"chatcmpl-{self.requests['llm']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": data.get("model", ""),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(answer) // 4,
+                      "total_tokens": prompt_tokens + len(answer) // 4},
+        })
+
+    def _message(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        self._message_ids += 1
+        message = {
+            "message_id": self._message_ids,
+            "date": int(time.time()),
+            "chat": {"id": -1000000000001, "type": "channel", "title": "Benchmark"},
+        }
+        if "photo" in parameters:
+            message["caption"] = parameters.get("caption", "")
+            message["photo"] = [{"file_id": f"photo-{self._message_ids}", "file_unique_id": f"{self._message_ids}",
+                                 "width": 800, "height": 600}]
+        else:
+            message["text"] = parameters.get("text", "")
+        return message
+
+    def _record_latency(self, text: str) -> None:
+        match = ENTRY_PATTERN.search(text)
+        if match:
+            self.latencies.append(time.time() - self._entry_time(int(match.group(1)), int(match.group(2))))
+
+    async def bot_api(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        parameters: Dict[str, Any] = dict(await request.post()) if request.can_read_body else {}
+        if method == "getMe":
+            result: Optional[Any] = {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+        elif method in ("sendMessage", "sendPhoto"):
+            self.requests["send"] += 1
+            await asyncio.sleep(self.telegram_latency)
+            result = self._message(parameters)
+            self._record_latency(str(parameters.get("caption") or parameters.get("text") or ""))
+        elif method == "getUpdates":
+            await asyncio.sleep(1)  # Long polling without any update
+            result = []
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    def application(self) -> web.Application:
+        app = web.Application(client_max_size=10 * 1024 * 1024)
+        app.router.add_get("/feeds/{feed}.xml", self.feed)
+        app.router.add_get("/articles/{feed}/{number}", self.article)
+        app.router.add_post("/v1/chat/completions", self.chat_completion)
+        app.router.add_post("/bot{token}/{method}", self.bot_api)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+        """Serve the stand-ins until the returned runner is cleaned up; sets base_url"""
+        runner = web.AppRunner(self.application(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        self.base_url = f"http://{host}:{runner.addresses[0][1]}"
+        return runner
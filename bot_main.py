@@ -1,37 +1,31 @@
 import asyncio
 import os
-import threading
+import signal
 
 from telegram.constants import ParseMode
 from telegram.ext import AIORateLimiter, Application, Defaults
 
+from core.config import BOT_POLLING
 from core.logger import logger
+from core.supervisor import Supervisor
 from tg.bot_command import set_default_commands
 from tg.handlers import HANDLERS
 from tg.handlers.errors import error_handler
-from tg.handlers.logic import monitor_feed
+from tg.handlers.logic import monitor_feed, telegram_publisher
 
 TELEGRAM_TOKEN = os.environ.get('BOT_TOKEN')
 
-stop_event = threading.Event()  # Use a threading.Event to signal when to stop the bot
-
-
-def start_bot_in_thread():
-    loop = asyncio.new_event_loop()  # Create a new event loop
-    asyncio.set_event_loop(loop)  # Set the new event loop as the default for this thread
 
+def build_application() -> Application:
     application = (
         Application.builder()
         .token(token=TELEGRAM_TOKEN)
         .defaults(defaults=Defaults(parse_mode=ParseMode.HTML, block=False))
         .rate_limiter(rate_limiter=AIORateLimiter(max_retries=3))
-        .post_init(post_init=on_startup)
         .build()
     )
-
     register_all_handlers(application=application)
-    loop.run_until_complete(application.run_polling(drop_pending_updates=True))  # Use the new event loop to run the bot
-    stop_event.set()  # Signal the main thread to stop when the bot stops
+    return application
 
 
 async def on_startup(application: Application) -> None:
@@ -43,11 +37,38 @@ def register_all_handlers(application: Application) -> None:
     application.add_error_handler(callback=error_handler)
 
 
+async def poll_updates(application: Application) -> None:
+    """Receive the bot commands until cancelled"""
+    await on_startup(application)
+    await application.start()
+    await application.updater.start_polling(drop_pending_updates=True)
+    try:
+        await asyncio.Future()  # Until the supervisor cancels the task
+    finally:
+        if application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+
+
 async def main():
-    bot_thread = threading.Thread(target=start_bot_in_thread)
-    bot_thread.start()
-    await monitor_feed()
-    stop_event.set()  # Signal the bot to stop
+    supervisor = Supervisor()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, supervisor.request_stop)
+        except NotImplementedError:  # Windows, where Ctrl+C still interrupts the loop
+            pass
+
+    application = build_application()
+    telegram_publisher.bot = application.bot  # The commands and the posts share one HTTP client and rate limiter
+    async with application:
+        if BOT_POLLING:
+            supervisor.start("bot", lambda: poll_updates(application))
+        try:
+            await monitor_feed(supervisor)
+        finally:
+            await supervisor.stop()
 
 
 if __name__ == "__main__":
@@ -57,5 +78,4 @@ if __name__ == "__main__":
     except Exception as exc:
         logger.critical("Unhandled error: %s", repr(exc))
     finally:
-        stop_event.wait()  # Wait for the bot to stop
         logger.info("Bot stopped!")
@@ -1,5 +1,7 @@
+import os
 from os.path import join, normpath
 from pathlib import Path
+from typing import Dict, Set
 
 # Change DEBUG to False when running on a production server
 DEBUG: bool = True
@@ -9,7 +11,118 @@ _BASE_DIR: Path = Path(__file__).resolve().parent.parent
 ENV_FILE: str = normpath(join(_BASE_DIR, ".env"))
 LOG_FILE: str = normpath(join(_BASE_DIR, "utils.log"))
 
+# Feed polling settings, in seconds
+FEED_MIN_POLL_INTERVAL: int = 120
+FEED_MAX_POLL_INTERVAL: int = 3600
+FEED_DEFAULT_POLL_INTERVAL: int = 600
+FEED_POLL_WORKERS: int = 4
+FEED_FETCH_TIMEOUT: float = 30.0  # A feed download taking longer counts as a failed poll
 
+# Feed health: after FEED_FAILURE_THRESHOLD failed polls in a row the circuit of a feed opens and it is only probed
+# again after FEED_PROBE_DELAY seconds, doubled with every failed probe up to FEED_MAX_PROBE_DELAY. The state is written
+# to the database every HEALTH_FLUSH_INTERVAL seconds, /health lists up to HEALTH_REPORT_SIZE failing feeds
+FEED_FAILURE_THRESHOLD: int = 3
+FEED_PROBE_DELAY: float = 600.0
+FEED_MAX_PROBE_DELAY: float = 24 * 3600.0
+HEALTH_FLUSH_INTERVAL: float = 60.0
+HEALTH_REPORT_SIZE: int = 20
 
+# Database settings
+DB_POOL_SIZE: int = 5
 
+# Pipeline settings: queue size between stages and workers per stage
+PIPELINE_QUEUE_SIZE: int = 20
+PIPELINE_SCRAPE_WORKERS: int = 8
+PIPELINE_LLM_WORKERS: int = 3
+PIPELINE_PUBLISH_WORKERS: int = 1
+PUBLISH_QUEUE_SIZE: int = 50
+PUBLISH_RETRIES: int = 3
+PUBLISH_RETRY_DELAY: float = 2.0  # Seconds before the first retry of a failed send, doubled on every further one
+ARTICLE_MAX_ATTEMPTS: int = 3  # Failed passes through the pipeline after which an article is dead-lettered
+ARTICLE_MAX_BYTES: int = 2 * 1024 * 1024  # Article pages are only read up to this size
+PARSE_WORKERS: int = int(os.environ.get("PARSE_WORKERS", "2"))  # Processes parsing feeds and pages, 0 uses a thread
 
+# Cache of resolved redirects of aggregated links (e.g. news.google.com): size and TTL in seconds
+RESOLVER_CACHE_SIZE: int = 2048
+RESOLVER_CACHE_TTL: int = 24 * 3600
+
+# Batched relevance classification: articles classified within the wait (seconds) share one LLM request,
+# packed up to CLASSIFY_BATCH_TOKEN_BUDGET prompt tokens
+CLASSIFY_BATCH_SIZE: int = 8
+CLASSIFY_BATCH_WAIT: float = 2.0
+CLASSIFY_BATCH_TOKEN_BUDGET: int = 6000
+
+# Token budgets of the article content sent to the LLM per call type. Longer articles are summarized map-reduce:
+# chunks of SUMMARY_CHUNK tokens are condensed first, then the notes are summarized
+TOKEN_BUDGET_CLASSIFY: int = 400
+TOKEN_BUDGET_SUMMARY: int = 3000
+TOKEN_BUDGET_SUMMARY_CHUNK: int = 2500
+
+# Local pre-classifier: articles scoring at or above ACCEPT are related to AI, at or below REJECT are not,
+# only the band in between is sent to the LLM
+PREFILTER_ACCEPT_SCORE: float = 0.85
+PREFILTER_REJECT_SCORE: float = 0.05
+# Per-feed bias added to the score; 1.0 accepts every article of an AI-only feed without scoring
+PREFILTER_FEED_TRUST: Dict[str, float] = {
+    "https://www.deepmind.com/blog/rss.xml": 1.0,
+    "https://bair.berkeley.edu/blog/feed.xml": 1.0,
+    "https://news.mit.edu/rss/topic/artificial-intelligence2": 1.0,
+    "https://openai.com/blog/rss.xml": 1.0,
+    "https://aws.amazon.com/blogs/machine-learning/feed/": 1.0,
+    "https://machinelearningmastery.com/blog/feed/": 1.0,
+    "https://www.marktechpost.com/feed/": 0.3,
+    "https://www.unite.ai/feed/": 0.3,
+    "https://dailyai.com/feed/": 0.3,
+}
+
+# LLM response cache: entries expire after the TTL (seconds), least recently used ones are evicted beyond the limit
+LLM_CACHE_TTL: int = 7 * 24 * 3600
+LLM_CACHE_MAX_ENTRIES: int = 5000
+
+# Summarization mode, selectable per deployment with the SUMMARY_MODE environment variable:
+# "refine" drafts the post and refines it with a second request, "single" writes the final post in one request
+SUMMARY_MODE: str = os.environ.get("SUMMARY_MODE", "refine")
+SUMMARY_MAX_CHARS: int = 800  # Telegram captions are limited to 1024 characters including title and link
+
+# Near-duplicate stories: articles whose SimHash differs in at most MAX_DISTANCE bits from a story seen within the
+# window (seconds) are skipped before classification
+NEAR_DUP_WINDOW: int = 12 * 3600
+NEAR_DUP_MAX_DISTANCE: int = 4
+
+# Several workers against one database (FEED_SHARDING=1): every worker leases its share of the feeds for LEASE_TTL
+# seconds and renews the leases every third of it, the feeds of a worker that stopped are taken over once they expire
+FEED_SHARDING: bool = os.environ.get("FEED_SHARDING", "0") == "1"
+LEASE_TTL: int = 90
+PUBLISH_CLAIM_TTL: int = 600  # A post claimed by a worker but not sent within this time may be sent by another one
+BOT_POLLING: bool = os.environ.get("BOT_POLLING", "1") == "1"  # Only one process may receive the bot updates
+
+# LLM governor: requests and tokens per minute of the OpenAI account (LLM_RPM / LLM_TPM environment variables), calls
+# in flight, deadline per call type in seconds (waiting for a slot included), completion tokens assumed before a call
+# and the pause of all calls after a 429 without Retry-After
+LLM_RPM: int = int(os.environ.get("LLM_RPM", "500"))
+LLM_TPM: int = int(os.environ.get("LLM_TPM", "60000"))
+LLM_CONCURRENCY: int = 4
+LLM_DEADLINE_CLASSIFY: float = 60.0
+LLM_DEADLINE_SUMMARY: float = 180.0
+LLM_COMPLETION_ESTIMATE: int = 500
+LLM_RATE_LIMIT_PAUSE: float = 20.0
+
+# Metrics in the Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics (port 0 disables the endpoint),
+# and the Telegram user ids allowed to use the admin commands (/stats), comma separated in ADMIN_IDS
+METRICS_HOST: str = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT: int = int(os.environ.get("METRICS_PORT", "9100"))
+ADMIN_IDS: Set[int] = {int(user_id) for user_id in os.environ.get("ADMIN_IDS", "").split(",") if user_id.strip()}
+
+# Runtime: a failed task is restarted after TASK_RESTART_DELAY seconds, doubled up to TASK_MAX_RESTART_DELAY while it
+# keeps failing. On SIGTERM the articles in the pipeline get DRAIN_TIMEOUT seconds to finish (Heroku kills a dyno 30
+# seconds after SIGTERM), the others continue from their checkpoints on the next start
+TASK_RESTART_DELAY: float = 1.0
+TASK_MAX_RESTART_DELAY: float = 60.0
+DRAIN_TIMEOUT: float = float(os.environ.get("DRAIN_TIMEOUT", "20"))
+
+# Logging: level, format of the records ("json" with the feed and article they are about, or "text") and at most
+# LOG_RATE_LIMIT INFO/DEBUG records per call site within LOG_RATE_WINDOW seconds, the others are counted and dropped
+LOG_LEVEL: str = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FORMAT: str = os.environ.get("LOG_FORMAT", "json")
+LOG_RATE_LIMIT: int = int(os.environ.get("LOG_RATE_LIMIT", "50"))
+LOG_RATE_WINDOW: float = 10.0
@@ -0,0 +1,169 @@
+"""
+Async access to the Postgres database
+
+Connections are opened lazily and kept in a small pool, and every query runs in a worker thread, so a database
+round-trip never blocks the event loop and no connection is shared between concurrent tasks.
+Writes that belong together (e.g. one polling cycle of a feed) are collected in a WriteBatch and committed in a single
+transaction. Any DB-API connection factory can be passed instead of psycopg2, e.g. to run against a local stand-in.
+"""
+
+import asyncio
+import functools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, List, Optional, Sequence, Tuple
+
+import psycopg2
+
+from core.config import DB_POOL_SIZE
+from core.logger import logger
+from core.metrics import metrics
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+DATABASE_SSLMODE = os.environ.get('DATABASE_SSLMODE', 'require')
+
+Statement = Tuple[str, Sequence[Any]]
+
+TRANSACTION_SECONDS = metrics.histogram("db_transaction_seconds", "Duration of a database transaction, commit included")
+
+
+def _run(connection, sql: str, params: Sequence[Any], fetch: Optional[str]) -> Any:
+    cursor = connection.cursor()
+    try:
+        cursor.execute(sql, params)
+        if fetch == "one":
+            return cursor.fetchone()
+        if fetch == "all":
+            return cursor.fetchall()
+        return None
+    finally:
+        cursor.close()
+
+
+def _run_many(connection, statements: Sequence[Statement]) -> None:
+    cursor = connection.cursor()
+    try:
+        for sql, params in statements:
+            cursor.execute(sql, params)
+    finally:
+        cursor.close()
+
+
+class Transaction:
+    """Queries on one pooled connection; committed or rolled back by Database.transaction()"""
+
+    def __init__(self, connection) -> None:
+        self._connection = connection
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> None:
+        await asyncio.to_thread(_run, self._connection, sql, params, None)
+
+    async def execute_many(self, statements: Sequence[Statement]) -> None:
+        await asyncio.to_thread(_run_many, self._connection, statements)
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[Tuple]:
+        return await asyncio.to_thread(_run, self._connection, sql, params, "one")
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        return await asyncio.to_thread(_run, self._connection, sql, params, "all")
+
+
+class WriteBatch:
+    """Collects write statements and commits them together in one transaction"""
+
+    def __init__(self, database: "Database") -> None:
+        self._database = database
+        self._statements: List[Statement] = []
+
+    def add(self, sql: str, params: Sequence[Any] = ()) -> None:
+        self._statements.append((sql, params))
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+    async def flush(self) -> None:
+        if not self._statements:
+            return
+        statements, self._statements = self._statements, []
+        async with self._database.transaction() as transaction:
+            await transaction.execute_many(statements)
+
+
+class Database:
+    """Lazily connected pool of database connections"""
+
+    def __init__(self, dsn: Optional[str] = DATABASE_URL, max_size: int = DB_POOL_SIZE,
+                 connect: Optional[Callable[[], Any]] = None) -> None:
+        self._connect = connect or functools.partial(psycopg2.connect, dsn, sslmode=DATABASE_SSLMODE)
+        self._idle: List[Any] = []
+        self._slots = asyncio.Semaphore(max_size)
+
+    async def _acquire(self):
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                connection = self._idle.pop()
+                if not getattr(connection, "closed", False):
+                    return connection
+            return await asyncio.to_thread(self._connect)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, connection, reusable: bool) -> None:
+        if reusable:
+            self._idle.append(connection)
+        else:
+            try:
+                connection.close()
+            except Exception as exc:
+                logger.warning("Failed to close a broken database connection: %s", exc)
+        self._slots.release()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[Transaction]:
+        """Runs the queries of the block on one connection and commits them together"""
+        started = time.perf_counter()
+        connection = await self._acquire()
+        reusable = True
+        try:
+            yield Transaction(connection)
+            await asyncio.to_thread(connection.commit)
+            TRANSACTION_SECONDS.observe(time.perf_counter() - started)
+        except BaseException:
+            try:
+                await asyncio.to_thread(connection.rollback)
+            except Exception:
+                reusable = False  # The connection itself is broken, don't put it back into the pool
+            raise
+        finally:
+            self._release(connection, reusable)
+
+    @asynccontextmanager
+    async def batch(self) -> AsyncIterator[WriteBatch]:
+        """Collects the writes of the block and commits them in one transaction if the block succeeds"""
+        batch = WriteBatch(self)
+        yield batch
+        await batch.flush()
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> None:
+        async with self.transaction() as transaction:
+            await transaction.execute(sql, params)
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[Tuple]:
+        async with self.transaction() as transaction:
+            return await transaction.fetchone(sql, params)
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        async with self.transaction() as transaction:
+            return await transaction.fetchall(sql, params)
+
+    async def close(self) -> None:
+        """Close the idle connections of the pool"""
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await asyncio.to_thread(connection.close)
+
+
+db: Database = Database()
@@ -11,7 +11,7 @@ class Environment:
 
     def __init__(self, path_to_env_file: str) -> None:
         if not path.exists(path_to_env_file):
-            logger.critical("Env file not found", path_to_env_file)
+            logger.critical("Env file not found: %s", path_to_env_file)
             sys_exit(1)
 
         self._env: Env = Env()
@@ -21,7 +21,7 @@ class Environment:
         try:
             return self._env.str(var_name)
         except EnvError as exc:
-            logger.critical(f"{var_name} not found", repr(exc))
+            logger.critical("%s not found: %s", var_name, repr(exc))
             sys_exit(repr(exc))
 
     def get_openai_api(self) -> str:
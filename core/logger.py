@@ -1,25 +1,154 @@
+"""
+Non-blocking logging
+
+A log call only puts the record on an in-memory queue; a listener thread formats it and writes it to stderr and, from
+ERROR up, to logs/app.log, so the event loop never waits for the console or the disk. Messages take lazy %-style
+arguments and are rendered as one JSON object per line (LOG_FORMAT=text for the classic format) together with the
+fields of log_context(), e.g. the feed and the article a record is about. INFO and DEBUG records are rate limited per
+call site: beyond LOG_RATE_LIMIT records in LOG_RATE_WINDOW seconds they are dropped, and the next record of that call
+site reports how many were.
+"""
+
+import atexit
+import contextvars
+import copy
+import datetime
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+from core.config import LOG_FORMAT, LOG_LEVEL, LOG_RATE_LIMIT, LOG_RATE_WINDOW
+
+TEXT_FORMAT = '[%(asctime)s] [%(levelname)s] [%(name)s] - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+LOG_DIRECTORY = "logs"
+
+_context: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("log_context", default={})
+
+
+@contextmanager
+def log_context(**fields: str) -> Iterator[None]:
+    """Add the fields to every record logged in the block, including by the tasks started in it"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+@contextmanager
+def without_log_context() -> Iterator[None]:
+    """Log the block without the fields of log_context(), e.g. work shared by several items"""
+    token = _context.set({})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Attaches the fields of log_context() to the record, in the task that logs it"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _context.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets at most `limit` records below WARNING per call site and window through, and counts the others"""
+
+    def __init__(self, limit: int, window: float) -> None:
+        super().__init__()
+        self._limit = limit
+        self._window = window
+        self._windows: Dict[Tuple[str, int], List] = {}  # Call site -> [window start, records, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self._limit <= 0:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or record.created - window[0] >= self._window:
+                if window is not None and window[2]:
+                    record.suppressed = window[2]
+                window = self._windows[key] = [record.created, 0, 0]
+            if window[1] >= self._limit:
+                window[2] += 1
+                return False
+            window[1] += 1
+            return True
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Enqueues the record with its message merged; formatting is left to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None  # The arguments may change after the call
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, context fields and the traceback, if any"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                                     .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic format, followed by the context fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        context = getattr(record, "context", {})
+        if context:
+            text += " [" + " ".join(f"{key}={value}" for key, value in context.items()) + "]"
+        if getattr(record, "suppressed", 0):
+            text += f" ({record.suppressed} similar records suppressed)"
+        return text
 
-# Define the logging level and format
-logging.basicConfig(level=logging.INFO,
-                    format='[%(asctime)s] [%(levelname)s] [%(name)s] - %(message)s',
-                    datefmt='%Y-%m-%d %H:%M:%S')
 
-# Create a logger object
-logger = logging.getLogger(__name__)
+def _start_listener() -> logging.handlers.QueueListener:
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else TextFormatter(TEXT_FORMAT, DATE_FORMAT)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+    os.makedirs(LOG_DIRECTORY, exist_ok=True)
+    file_handler = logging.FileHandler(f"{LOG_DIRECTORY}/app.log")
+    file_handler.setLevel(logging.ERROR)
+    file_handler.setFormatter(formatter)
 
-# Create a file handler for logging
-log_directory = "logs"
-if not os.path.exists(log_directory):
-    os.makedirs(log_directory)
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT, LOG_RATE_WINDOW))
+    queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
 
-file_handler = logging.FileHandler(f"{log_directory}/app.log")
-file_handler.setLevel(logging.ERROR)
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Writes the records still in the queue
+    return listener
 
-# Create a logging format for the file handler
-formatter = logging.Formatter('[%(asctime)s] [%(levelname)s] [%(name)s] - %(message)s')
-file_handler.setFormatter(formatter)
 
-# Add the file handler to the logger
-logger.addHandler(file_handler)
+listener: logging.handlers.QueueListener = _start_listener()
+logger: logging.Logger = logging.getLogger(__name__)
@@ -0,0 +1,197 @@
+"""
+Lightweight in-process metrics
+
+Counters, gauges and latency histograms with labels, rendered in the Prometheus text exposition format. Histograms use
+fixed buckets, so recording a sample is a bisect and an increment, and quantiles for the /stats command are estimated
+from the buckets. Gauges are read from a callback when the metrics are rendered, so the existing hit/miss counters of
+the caches are exposed without being duplicated.
+"""
+
+import asyncio
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+from core.logger import logger
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = _labels(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {value}" for labels, value in list(self.values.items())]
+
+
+class Gauge:
+    """Current value read from a callback"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, read: Callable[[], float]) -> None:
+        self.name = name
+        self.description = description
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f"{self.name} {self.read()}"]
+
+
+class HistogramSeries:
+    """Bucket counts of one label set"""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.counts = [0] * (len(buckets) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Distribution of observed values per label set, over fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.series: Dict[Labels, HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series.setdefault(key, HistogramSeries(self.buckets))
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the block in seconds, also when it fails"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        series = self.series.get(_labels(labels))
+        return series.count if series is not None else 0
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """Estimate the q-quantile by linear interpolation within its bucket; None without samples"""
+        series = self.series.get(_labels(labels))
+        if series is None or not series.count:
+            return None
+        rank = q * series.count
+        seen = 0
+        for index, count in enumerate(series.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, series in list(self.series.items()):
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], series.counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', str(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series.sum}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series.count}")
+        return lines
+
+
+class Registry:
+    """All metrics of the process by name"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._register(Counter(name, description))
+
+    def gauge(self, name: str, description: str, read: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, description, read))
+
+    def histogram(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, buckets))
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics: Registry = Registry()
+
+
+async def serve_metrics(host: str, port: int) -> None:
+    """Serve the metrics at http://host:port/metrics until cancelled; returns if the port can't be bound"""
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as exc:  # E.g. another worker on this host serves them, retrying won't free the port
+        logger.error("Metrics not served, http://%s:%d is not available: %s", host, port, exc)
+        await runner.cleanup()
+        return
+    logger.info("Serving metrics on http://%s:%d/metrics", host, port)
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await runner.cleanup()
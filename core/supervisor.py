@@ -0,0 +1,75 @@
+"""
+Supervisor of the long-lived tasks of the process
+
+The bot polling, the feed scheduler, the pipeline, the publisher and the other services run as named tasks on one event
+loop. A task that fails is restarted after a delay that doubles while it keeps failing, so a crash in one of them
+neither stops the others nor restarts in a tight loop; a task that returns is done. Tasks belong to groups, so the
+shutdown can stop the intake first, let the work in progress drain and only then stop the rest.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from core.config import TASK_MAX_RESTART_DELAY, TASK_RESTART_DELAY
+from core.logger import logger
+from core.metrics import metrics
+
+TaskFactory = Callable[[], Awaitable[None]]
+
+TASK_RESTARTS = metrics.counter("task_restarts_total", "Supervised tasks restarted after a failure, by group")
+
+
+class Supervisor:
+    """Named tasks by group, restarted with backoff when they fail"""
+
+    def __init__(self, restart_delay: float = TASK_RESTART_DELAY,
+                 max_restart_delay: float = TASK_MAX_RESTART_DELAY) -> None:
+        self._restart_delay = restart_delay
+        self._max_restart_delay = max_restart_delay
+        self._tasks: Dict[str, Tuple[str, asyncio.Task]] = {}  # Name -> (group, task)
+        self._stopping = asyncio.Event()
+
+    def start(self, name: str, factory: TaskFactory, group: Optional[str] = None) -> None:
+        """Run factory() as the task `name` until it returns; a task of that name that is still running is kept"""
+        if name in self._tasks:
+            return
+        group = group or name
+        task = asyncio.create_task(self._supervise(name, group, factory), name=name)
+        self._tasks[name] = (group, task)
+        task.add_done_callback(lambda _: self._tasks.pop(name, None))
+
+    async def _supervise(self, name: str, group: str, factory: TaskFactory) -> None:
+        delay = self._restart_delay
+        while True:
+            started = time.monotonic()
+            try:
+                await factory()
+                return
+            except Exception as exc:
+                TASK_RESTARTS.inc(group=group)
+                if time.monotonic() - started > self._max_restart_delay:
+                    delay = self._restart_delay  # It ran fine for a while, so this is a new failure
+                logger.error("Task '%s' failed, restarting in %.0fs. Error: %r", name, delay, exc)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._max_restart_delay)
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    def request_stop(self) -> None:
+        """Ask the process to shut down, e.g. from the SIGTERM handler"""
+        if not self._stopping.is_set():
+            logger.info("Shutdown requested")
+            self._stopping.set()
+
+    async def wait_for_stop(self) -> None:
+        await self._stopping.wait()
+
+    async def stop(self, *groups: str) -> None:
+        """Cancel the tasks of the groups, all of them if none is given, and wait until they have ended"""
+        tasks = [task for group, task in list(self._tasks.values()) if not groups or group in groups]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -14,6 +14,8 @@ async def set_default_commands(application: Application) -> None:
         BotCommand(command="start", description="ℹ️ Bot info"),
         BotCommand(command="add", description="ℹ️ Bot info"),
         BotCommand(command="delete", description="ℹ️ FreeName"),
+        BotCommand(command="stats", description="📊 Pipeline statistics"),
+        BotCommand(command="health", description="🩺 Failing feeds"),
 
     ]
     await application.bot.set_my_commands(commands=commands, scope=None, language_code=None)
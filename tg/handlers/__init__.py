@@ -1,6 +1,8 @@
 from tg.handlers.handlers import (
     add_handler,
     delete_handler,
+    stats_handler,
+    health_handler,
     button_handler
 )
 
@@ -8,5 +10,7 @@ from tg.handlers.handlers import (
 HANDLERS: tuple = (  # the order of the elements is important
     add_handler,
     delete_handler,
+    stats_handler,
+    health_handler,
     button_handler
 )
@@ -0,0 +1,61 @@
+"""
+Micro-batching of concurrent requests
+
+Callers submit single items and wait for their own result, while the batcher groups everything submitted within a
+short window (or until the batch is full) into one call of the batch function.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+from core.logger import without_log_context
+
+BatchFunction = Callable[[List[Any]], Awaitable[List[Any]]]
+
+
+class MicroBatcher:
+    """Groups items submitted within `max_wait` seconds, at most `max_size` of them, into one batch call"""
+
+    def __init__(self, process: BatchFunction, max_size: int, max_wait: float) -> None:
+        self._process = process
+        self._max_size = max_size
+        self._max_wait = max_wait
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        """Return the result for the item once its batch has been processed"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self._max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            with without_log_context():  # The batch serves all its callers, not just the one that filled it
+                results = await self._process([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch function returned {len(results)} results for {len(batch)} items")
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
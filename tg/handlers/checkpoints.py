@@ -0,0 +1,129 @@
+"""
+Per-article checkpoints
+
+The progress of an article through the pipeline is stored as a small state record: its scraped content and image, the
+relevance verdict, the summary and the id of the published message. Every stage records its result as soon as it is
+done and skips its work when the result is already there, so a retry or a restart resumes at the first incomplete
+stage instead of downloading, classifying and summarizing the article again. An article is recorded as soon as it
+enters the pipeline, so one still waiting for its download is resumed after a restart too. The record is deleted in
+the same transaction that adds the article to the ledger. An article that fails ARTICLE_MAX_ATTEMPTS times is
+dead-lettered: it goes into the ledger so no poll picks it up again, and its record stays with the stage "dead" and the
+last error.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+from dateutil import parser
+
+from core.config import ARTICLE_MAX_ATTEMPTS
+from core.db import WriteBatch, db
+from core.logger import logger
+from tg.handlers.ledger import mark_processed
+
+# Article fields saved in the checkpoint, the ones added by the stages are only saved once present
+STATE_FIELDS = ("rss_url", "title", "link", "pub_date", "content", "image", "verdict", "summary", "message_id",
+                "attempts", "error")
+DEAD_STAGE = "dead"
+
+
+def _dump_state(article: Dict[str, Any]) -> str:
+    state = {field: article[field] for field in STATE_FIELDS if field in article}
+    state["pub_date"] = article["pub_date"].isoformat()
+    return json.dumps(state)
+
+
+def _load_state(key: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    article = dict(state, key=key)
+    article["pub_date"] = parser.isoparse(state["pub_date"])
+    return article
+
+
+async def init_checkpoints():
+    """Create the checkpoint table if it doesn't exist."""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS article_checkpoints (
+            article_key CHAR(40) PRIMARY KEY,
+            stage TEXT NOT NULL,
+            state JSONB NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+        );
+    """)
+
+
+async def save_checkpoint(article: Dict[str, Any], stage: str):
+    """Record that the article completed the stage, along with everything it has gathered so far."""
+    try:
+        await db.execute("""
+            INSERT INTO article_checkpoints (article_key, stage, state) VALUES (%s, %s, %s::jsonb)
+            ON CONFLICT (article_key) DO UPDATE
+            SET stage = EXCLUDED.stage, state = EXCLUDED.state, updated_at = NOW() AT TIME ZONE 'utc';
+        """, (article["key"], stage, _dump_state(article)))
+    except Exception as exc:  # Without the checkpoint a retry only repeats the stage
+        logger.warning("Failed to checkpoint the article '%s' after stage '%s': %s", article['title'], stage, exc)
+
+
+async def checkpoint_submitted(articles: Sequence[Dict[str, Any]]):
+    """Record the articles entering the pipeline that have no checkpoint yet, with one statement."""
+    if not articles:
+        return
+    await db.execute("""
+        INSERT INTO article_checkpoints (article_key, stage, state)
+        SELECT key, 'submit', state FROM unnest(%s::text[], %s::jsonb[]) AS submitted (key, state)
+        ON CONFLICT (article_key) DO NOTHING;
+    """, ([article["key"] for article in articles], [_dump_state(article) for article in articles]))
+
+
+async def record_failure(article: Dict[str, Any], error: Exception) -> bool:
+    """
+    Count a failed pass of the article through the pipeline in its checkpoint.
+
+    :return: True if the article has been dead-lettered, False if it may be tried again
+    """
+    article["attempts"] = article.get("attempts", 0) + 1
+    article["error"] = f"{type(error).__name__}: {error}"
+    if article["attempts"] < ARTICLE_MAX_ATTEMPTS:
+        await db.execute("""
+            INSERT INTO article_checkpoints (article_key, stage, state) VALUES (%s, 'submit', %s::jsonb)
+            ON CONFLICT (article_key) DO UPDATE SET state = EXCLUDED.state, updated_at = NOW() AT TIME ZONE 'utc';
+        """, (article["key"], _dump_state(article)))
+        return False
+    async with db.batch() as batch:
+        mark_processed(batch, article["rss_url"], article)
+        batch.add("""
+            INSERT INTO article_checkpoints (article_key, stage, state) VALUES (%s, %s, %s::jsonb)
+            ON CONFLICT (article_key) DO UPDATE
+            SET stage = EXCLUDED.stage, state = EXCLUDED.state, updated_at = NOW() AT TIME ZONE 'utc';
+        """, (article["key"], DEAD_STAGE, _dump_state(article)))
+    return True
+
+
+async def resume_articles(articles: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return the articles with the progress of their checkpoints restored, with one query."""
+    if not articles:
+        return []
+    keys = [article["key"] for article in articles]
+    rows = await db.fetchall("SELECT article_key, state FROM article_checkpoints WHERE article_key = ANY(%s);",
+                             (keys,))
+    states = {row[0]: row[1] for row in rows}
+    return [_load_state(article["key"], states[article["key"]]) if article["key"] in states else article
+            for article in articles]
+
+
+async def load_checkpoints(rss_urls: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """Return the articles left unfinished, e.g. by a restart, of the given feeds or of all feeds, oldest first."""
+    if rss_urls is None:
+        rows = await db.fetchall("""
+            SELECT article_key, state FROM article_checkpoints WHERE stage <> %s ORDER BY updated_at;
+        """, (DEAD_STAGE,))
+    else:
+        rows = await db.fetchall("""
+            SELECT article_key, state FROM article_checkpoints WHERE stage <> %s AND state->>'rss_url' = ANY(%s)
+            ORDER BY updated_at;
+        """, (DEAD_STAGE, list(rss_urls)))
+    return [_load_state(row[0], row[1]) for row in rows]
+
+
+def clear_checkpoint(batch: WriteBatch, article: Dict[str, Any]):
+    """Delete the checkpoint of the finished article as part of the current batch of writes."""
+    batch.add("DELETE FROM article_checkpoints WHERE article_key = %s;", (article["key"],))
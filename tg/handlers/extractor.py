@@ -0,0 +1,35 @@
+"""
+Bounded, single-pass article extractor
+
+The article page is downloaded up to a size cap and handed to tg.parsers.extract_page in the parser pool, so the
+parsing never runs on the event loop.
+"""
+
+from typing import Optional, Tuple
+from urllib.parse import urljoin
+
+from aiohttp import ClientResponse
+
+from core.config import ARTICLE_MAX_BYTES
+from core.logger import logger
+from tg.handlers.parsing import parser_pool
+from tg.parsers import extract_page
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def extract_article(response: ClientResponse, max_bytes: int = ARTICLE_MAX_BYTES) -> Tuple[str, Optional[str]]:
+    """
+    Read at most max_bytes of the page of the response and extract it in the parser pool
+
+    :return: the largest text block and the absolute URL of the lead image, if any
+    """
+    body = bytearray()
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        body.extend(chunk)
+        if len(body) >= max_bytes:
+            logger.warning("Article page %s exceeds %d bytes, the rest is ignored", response.url, max_bytes)
+            del body[max_bytes:]
+            break
+    content, image = await parser_pool.run(extract_page, bytes(body), response.charset)
+    return content, urljoin(str(response.url), image) if image else None
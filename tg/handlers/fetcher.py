@@ -0,0 +1,72 @@
+"""
+Conditional GET fetcher for RSS feeds
+
+Feeds are downloaded through the shared aiohttp session. The ETag / Last-Modified validators of every feed are kept,
+so an unchanged feed is answered with a cheap 304 and never parsed. Changed bodies are parsed in the parser pool.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from aiohttp import ClientSession, ClientTimeout
+
+from core.config import FEED_FETCH_TIMEOUT
+from core.logger import logger
+from core.metrics import metrics
+from tg.handlers.parsing import parser_pool
+from tg.parsers import parse_feed
+
+
+FETCH_SECONDS = metrics.histogram("feed_fetch_seconds", "Duration of a feed download and parse")
+NOT_MODIFIED = metrics.counter("feed_not_modified_total", "Feed fetches answered with 304 Not Modified")
+
+
+class FeedFetcher:
+    """Fetches feeds with conditional requests and remembers the validators per feed URL"""
+
+    def __init__(self) -> None:
+        self._validators: Dict[str, Dict[str, str]] = {}
+
+    def _conditional_headers(self, rss_url: str) -> Dict[str, str]:
+        validators = self._validators.get(rss_url, {})
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def forget(self, rss_url: str) -> None:
+        """Drop the stored validators, so the next fetch downloads the full feed"""
+        self._validators.pop(rss_url, None)
+
+    async def fetch(self, session: ClientSession, rss_url: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns the entries of the feed (see parse_feed), or None if the feed has not changed since the previous fetch
+
+        :raises aiohttp.ClientResponseError: if the server answers with an error status
+        """
+        with FETCH_SECONDS.time():
+            return await self._fetch(session, rss_url)
+
+    async def _fetch(self, session: ClientSession, rss_url: str) -> Optional[List[Dict[str, Any]]]:
+        # A feed that hangs must not hold a poll worker for the default five minutes of the session
+        timeout = ClientTimeout(total=FEED_FETCH_TIMEOUT)
+        async with session.get(rss_url, headers=self._conditional_headers(rss_url), timeout=timeout) as response:
+            if response.status == 304:
+                NOT_MODIFIED.inc()
+                logger.debug("Feed not modified: %s", rss_url)
+                return None
+            response.raise_for_status()
+            body = await response.read()
+            response_headers = {name.lower(): value for name, value in response.headers.items()}
+
+        entries = await parser_pool.run(parse_feed, body, response_headers)
+        # Remember the validators only once the body has been parsed, so a failed parse is retried in full
+        self._validators[rss_url] = {
+            "etag": response_headers.get("etag"),
+            "last_modified": response_headers.get("last-modified"),
+        }
+        return entries
+
+
+feed_fetcher: FeedFetcher = FeedFetcher()
@@ -0,0 +1,97 @@
+"""
+Local post-processing of generated posts
+
+Enforces the formatting rules of a channel post without another LLM round-trip: only the HTML tags Telegram should
+render are kept, mentions of the chosen mood are stripped and the length is capped without leaving a tag open.
+"""
+
+import html
+import re
+
+from core.config import SUMMARY_MAX_CHARS
+
+ALLOWED_TAGS = ("b", "i")
+MOODS = ("cheerful", "sarcastic", "contemplative", "humorous", "serious")
+
+_MARKDOWN_BOLD = re.compile(r"\*\*(.+?)\*\*", re.DOTALL)
+_TAG = re.compile(r"<\s*(/?)\s*([a-zA-Z]+)[^>]*>")
+_MOOD_LABEL = re.compile(
+    r"^\s*(?:mood|tone|emotion)\s*:\s*\w+\s*$"  # A line like "Mood: Sarcastic"
+    r"|(?<=[.!?…])\s*(?:mood|tone|emotion)\s*:\s*\w+[.!]?\s*\Z"  # "Details. Mood: Sarcastic" ending the post
+    r"|\(\s*(?:mood\s*:\s*)?(?:" + "|".join(MOODS) + r")\s*\)"  # "(Sarcastic)"
+    r"|\[\s*(?:" + "|".join(MOODS) + r")\s*\]"  # "[Sarcastic]"
+    r"|^\s*(?:" + "|".join(MOODS) + r")\s*(?:mood)?\s*:\s*",  # "Sarcastic: ..." at the start of a line
+    re.IGNORECASE | re.MULTILINE,
+)
+_SENTENCE_END = re.compile(r"[.!?…](?=\s|$)")
+
+
+def _keep_allowed_tags(text: str) -> str:
+    """Escape the text and re-create only the allowed tags, normalizing <strong>/<em> to <b>/<i>"""
+    parts, position = [], 0
+    for match in _TAG.finditer(text):
+        parts.append(html.escape(html.unescape(text[position:match.start()]), quote=False))
+        closing, name = match.group(1), match.group(2).lower()
+        name = {"strong": "b", "em": "i"}.get(name, name)
+        if name in ALLOWED_TAGS:
+            parts.append(f"<{closing}{name}>")
+        elif name == "br":
+            parts.append("\n")
+        position = match.end()
+    parts.append(html.escape(html.unescape(text[position:]), quote=False))
+    return "".join(parts)
+
+
+def _balance_tags(text: str) -> str:
+    """Drop closing tags without an opening one and close the tags left open"""
+    open_tags, parts, position = [], [], 0
+    for match in _TAG.finditer(text):
+        parts.append(text[position:match.start()])
+        closing, name = match.group(1), match.group(2)
+        if not closing:
+            open_tags.append(name)
+            parts.append(match.group(0))
+        elif name in open_tags:
+            while open_tags:  # Close the tags nested inside as well
+                tag = open_tags.pop()
+                parts.append(f"</{tag}>")
+                if tag == name:
+                    break
+        position = match.end()
+    parts.append(text[position:])
+    parts.extend(f"</{tag}>" for tag in reversed(open_tags))
+    return "".join(parts)
+
+
+def _visible_length(text: str) -> int:
+    return len(html.unescape(_TAG.sub("", text)))
+
+
+def _cap_length(text: str, max_chars: int) -> str:
+    """Cut the post at the last sentence end that keeps its visible text within max_chars"""
+    if _visible_length(text) <= max_chars:
+        return text
+    cut = None
+    for match in _SENTENCE_END.finditer(text):
+        if _visible_length(text[:match.end()]) > max_chars:
+            break
+        cut = match.end()
+    if cut is None:  # No sentence fits, cut at the last word boundary instead
+        cut = max_chars
+        while _visible_length(text[:cut]) > max_chars - 1:
+            cut -= 1
+        cut = text.rfind(" ", 0, cut) if " " in text[:cut] else cut
+        return re.sub(r"<[^>]*$", "", text[:cut]).rstrip() + "…"
+    return text[:cut]
+
+
+def format_post(text: str, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """Return the generated post in the channel format: allowed tags only, no mood mentions, at most max_chars"""
+    text = _MARKDOWN_BOLD.sub(r"<b>\1</b>", text.strip())
+    text = _MOOD_LABEL.sub("", text)
+    text = _keep_allowed_tags(text)
+    text = re.sub(r"[ \t]+([.,!?;:])", r"\1", text)  # Space left in front of punctuation by a removed mention
+    text = re.sub(r"[ \t]{2,}", " ", text)
+    text = re.sub(r"[ \t]*\n[ \t]*", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text).strip()
+    return _balance_tags(_cap_length(text, max_chars)).strip()
@@ -0,0 +1,179 @@
+"""
+Concurrency governor for the LLM calls
+
+Every call to the OpenAI API first takes a slot from the governor, which keeps the requests and tokens of the last
+minute within the RPM / TPM budgets of the account and caps the calls in flight. Tokens are estimated from the prompt
+before the call and corrected with the reported usage afterwards. Waiting calls are served by priority, so the
+classification of new articles is never stuck behind a queue of summaries, and a call whose deadline passes while
+waiting fails instead of piling up. A 429 pauses all calls for the advised time instead of every caller retrying.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from core.config import LLM_CONCURRENCY, LLM_RPM, LLM_TPM
+from core.logger import logger
+from core.metrics import metrics
+
+PRIORITY_CLASSIFY = 0
+PRIORITY_SUMMARY = 1
+PRIORITY_NAMES = {PRIORITY_CLASSIFY: "classify", PRIORITY_SUMMARY: "summary"}
+WINDOW = 60.0  # Seconds the RPM / TPM budgets refer to
+
+SLOT_WAIT_SECONDS = metrics.histogram("llm_slot_wait_seconds", "Time an LLM call waited for a governor slot")
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The call did not get a slot, or did not finish, before its deadline"""
+
+
+class Ticket:
+    """An admitted call, counted against the budgets of the window"""
+
+    def __init__(self, tokens: int, deadline: float) -> None:
+        self.tokens = tokens
+        self.deadline = deadline
+        self.admitted_at = 0.0
+
+    @property
+    def remaining(self) -> float:
+        """Seconds left until the deadline"""
+        return max(self.deadline - time.monotonic(), 0.0)
+
+
+class WaitStats:
+    """Wait times for a slot, per priority"""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total = 0.0
+        self.longest = 0.0
+        self.expired = 0
+
+    def add(self, waited: float) -> None:
+        self.calls += 1
+        self.total += waited
+        self.longest = max(self.longest, waited)
+
+    @property
+    def average(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+class LLMGovernor:
+    """Admits the LLM calls by priority within the request, token and concurrency budgets"""
+
+    def __init__(self, rpm: int = LLM_RPM, tpm: int = LLM_TPM, concurrency: int = LLM_CONCURRENCY) -> None:
+        self._rpm = rpm
+        self._tpm = tpm
+        self._concurrency = concurrency
+        self._in_flight = 0
+        self._window: Deque[Ticket] = deque()  # Admitted within the last WINDOW seconds, oldest first
+        self._window_tokens = 0
+        self._waiting: List[Tuple[int, int, Ticket, asyncio.Future]] = []  # (priority, order, ticket, future)
+        self._order = itertools.count()
+        self._paused_until = 0.0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self.stats: Dict[int, WaitStats] = {priority: WaitStats() for priority in PRIORITY_NAMES}
+
+    def _expire_window(self, now: float) -> None:
+        while self._window and now - self._window[0].admitted_at >= WINDOW:
+            self._window_tokens -= self._window.popleft().tokens
+
+    def _fits(self, tokens: int) -> bool:
+        if len(self._window) >= self._rpm:
+            return False
+        # A single call larger than the whole budget is admitted once the window is empty, otherwise it never would be
+        return self._window_tokens + tokens <= self._tpm or not self._window
+
+    def _schedule_wakeup(self, delay: float) -> None:
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _dispatch(self) -> None:
+        """Admit the waiting calls in priority order while the budgets allow"""
+        now = time.monotonic()
+        self._expire_window(now)
+        while self._waiting and self._in_flight < self._concurrency:
+            _, _, ticket, future = self._waiting[0]
+            if future.done():  # Its deadline passed while waiting
+                heapq.heappop(self._waiting)
+                continue
+            if now < self._paused_until:
+                self._schedule_wakeup(self._paused_until - now)
+                return
+            if not self._fits(ticket.tokens):
+                self._schedule_wakeup(WINDOW - (now - self._window[0].admitted_at))
+                return
+            heapq.heappop(self._waiting)
+            ticket.admitted_at = now
+            self._window.append(ticket)
+            self._window_tokens += ticket.tokens
+            self._in_flight += 1
+            future.set_result(None)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every call for `seconds`, e.g. after the API answered 429"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        logger.warning("LLM calls paused for %.0fs", seconds)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int, priority: int = PRIORITY_SUMMARY,
+                   deadline: float = 120.0) -> AsyncIterator[Ticket]:
+        """
+        Wait for a slot for a call of about `tokens` tokens and hold it while the block runs
+
+        :param deadline: seconds for the whole call, the wait included; the ticket tells the block how many are left
+        :raises DeadlineExceeded: if no slot is free before the deadline
+        """
+        started = time.monotonic()
+        ticket = Ticket(tokens, started + deadline)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._order), ticket, future))
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), deadline)
+        except BaseException as exc:
+            if future.done() and not future.cancelled():
+                self._in_flight -= 1  # Admitted just as the wait ended, give the slot back
+                self._dispatch()
+            else:
+                future.cancel()
+            if isinstance(exc, asyncio.TimeoutError):
+                self.stats[priority].expired += 1
+                raise DeadlineExceeded(f"No LLM slot within {deadline:.0f}s") from None
+            raise
+        waited = time.monotonic() - started
+        self.stats[priority].add(waited)
+        SLOT_WAIT_SECONDS.observe(waited, call=PRIORITY_NAMES.get(priority, str(priority)))
+        if waited > 1:
+            logger.info("LLM %s call waited %.1fs for a slot", PRIORITY_NAMES.get(priority, priority), waited)
+
+        try:
+            yield ticket
+        finally:
+            self._in_flight -= 1
+            self._dispatch()
+
+    def settle(self, ticket: Ticket, tokens: int) -> None:
+        """Replace the estimated tokens of the call with the usage reported by the API"""
+        if ticket in self._window:
+            self._window_tokens += tokens - ticket.tokens
+        ticket.tokens = tokens
+
+    def report(self) -> str:
+        """One line of wait statistics per priority"""
+        return "\n".join(
+            f"{PRIORITY_NAMES.get(priority, priority)}: {stats.calls} calls, average wait {stats.average:.2f}s, "
+            f"longest {stats.longest:.2f}s, {stats.expired} expired"
+            for priority, stats in self.stats.items()
+        )
+
+
+llm_governor: LLMGovernor = LLMGovernor()
@@ -1,9 +1,10 @@
-import json
-
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import CommandHandler, CallbackContext, CallbackQueryHandler
 
-from core import PROJECT_ROOT
+from core.config import ADMIN_IDS
+from tg.handlers.health import feed_health
+from tg.handlers.registry import feed_registry
+from tg.handlers.stats import render_stats
 
 
 # Callback function to handle button presses
@@ -11,16 +12,10 @@ async def button(update: Update, context: CallbackContext) -> None:
     query = update.callback_query
     rss_url = query.data
 
-    with open(PROJECT_ROOT.joinpath("rss_feeds.json"), "r+") as file:
-        feeds = json.load(file)
-        if rss_url in feeds:
-            del feeds[rss_url]
-            file.seek(0)
-            file.truncate()
-            json.dump(feeds, file)
-            await query.edit_message_text(text=f"Deleted RSS feed: {rss_url}")
-        else:
-            await query.edit_message_text(text=f"RSS feed not found!")
+    if await feed_registry.remove(rss_url):
+        await query.edit_message_text(text=f"Deleted RSS feed: {rss_url}")
+    else:
+        await query.edit_message_text(text=f"RSS feed not found!")
 
 
 async def add(update: Update, context: CallbackContext):
@@ -30,12 +25,7 @@ async def add(update: Update, context: CallbackContext):
         return
 
     url, name = context.args
-    with open(PROJECT_ROOT.joinpath("rss_feeds.json"), "r+") as file:
-        feeds = json.load(file)
-        feeds[url] = name
-        file.seek(0)
-        file.truncate()
-        json.dump(feeds, file)
+    await feed_registry.add(url, name)
 
     await update.message.reply_text(f"Added RSS feed: {name}")
     # latest_pub_dates = {url: None}
@@ -45,21 +35,42 @@ async def add(update: Update, context: CallbackContext):
 
 
 async def delete(update, context):
-    with open(PROJECT_ROOT.joinpath("rss_feeds.json"), "r") as file:
-        feeds = json.load(file)
-
     keyboard = []
-    for rss_url, name in feeds.items():
+    for rss_url, name in feed_registry.feeds().items():
         keyboard.append([InlineKeyboardButton(name, callback_data=rss_url)])
 
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text('Select the RSS feed to delete:', reply_markup=reply_markup)
 
 
+def is_admin(update: Update) -> bool:
+    return update.effective_user is not None and update.effective_user.id in ADMIN_IDS
+
+
+async def stats(update: Update, context: CallbackContext):
+    if not is_admin(update):
+        await update.message.reply_text("This command is only available to admins.")
+        return
+    await update.message.reply_text(render_stats())
+
+
+async def health(update: Update, context: CallbackContext):
+    if not is_admin(update):
+        await update.message.reply_text("This command is only available to admins.")
+        return
+    await update.message.reply_text(await feed_health.report(feed_registry.feeds()))
+
+
 add_handler: CommandHandler = CommandHandler(
     command="add", callback=add)
 
 delete_handler: CommandHandler = CommandHandler(
     command="delete", callback=delete)
 
+stats_handler: CommandHandler = CommandHandler(
+    command="stats", callback=stats)
+
+health_handler: CommandHandler = CommandHandler(
+    command="health", callback=health)
+
 button_handler: CallbackQueryHandler = CallbackQueryHandler(callback=button)
@@ -0,0 +1,212 @@
+"""
+Health of the feeds and their circuit breakers
+
+Every poll of a feed records whether it failed and how long the download took. After FEED_FAILURE_THRESHOLD failures in
+a row the circuit of the feed opens: it is not polled again until a probe is due FEED_PROBE_DELAY seconds later,
+doubled with every failed probe up to FEED_MAX_PROBE_DELAY, and the first successful poll closes it. A dead feed then
+costs one request per probe instead of a poll worker on every cycle. The state is kept in memory and written to the
+feed_health table with one statement every HEALTH_FLUSH_INTERVAL seconds, so it survives restarts and the /health
+command sees the feeds of every worker.
+"""
+
+import asyncio
+import html
+import time
+from typing import Dict, Optional, Set
+
+from core.config import (
+    FEED_FAILURE_THRESHOLD,
+    FEED_MAX_PROBE_DELAY,
+    FEED_PROBE_DELAY,
+    HEALTH_FLUSH_INTERVAL,
+    HEALTH_REPORT_SIZE,
+)
+from core.db import db
+from core.logger import logger
+from core.metrics import metrics
+
+FETCH_TIME_WEIGHT = 0.2  # Weight of the latest download in the moving average of the fetch time
+ERROR_MAX_CHARS = 200
+
+
+class FeedState:
+    """Health of one feed; times are Unix timestamps"""
+
+    def __init__(self, failures: int = 0, last_success: Optional[float] = None, last_failure: Optional[float] = None,
+                 last_error: Optional[str] = None, fetch_seconds: Optional[float] = None,
+                 open_until: Optional[float] = None) -> None:
+        self.failures = failures  # Consecutive failed polls
+        self.last_success = last_success
+        self.last_failure = last_failure
+        self.last_error = last_error
+        self.fetch_seconds = fetch_seconds  # Moving average of the download time
+        self.open_until = open_until  # While the circuit is open: when the next probe is due
+
+    def observe_fetch(self, seconds: float) -> None:
+        if self.fetch_seconds is None:
+            self.fetch_seconds = seconds
+        else:
+            self.fetch_seconds += FETCH_TIME_WEIGHT * (seconds - self.fetch_seconds)
+
+
+class FeedHealth:
+    """Health of all the feeds, with a circuit breaker per feed"""
+
+    def __init__(self, threshold: int = FEED_FAILURE_THRESHOLD, probe_delay: float = FEED_PROBE_DELAY,
+                 max_probe_delay: float = FEED_MAX_PROBE_DELAY) -> None:
+        self._threshold = threshold
+        self._probe_delay = probe_delay
+        self._max_probe_delay = max_probe_delay
+        self._states: Dict[str, FeedState] = {}
+        self._dirty: Set[str] = set()
+        self._deleted: Set[str] = set()
+
+    async def init(self):
+        """Create the table if it doesn't exist and load the state of the feeds."""
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS feed_health (
+                rss_url TEXT PRIMARY KEY,
+                failures INTEGER NOT NULL,
+                last_success DOUBLE PRECISION,
+                last_failure DOUBLE PRECISION,
+                last_error TEXT,
+                fetch_seconds DOUBLE PRECISION,
+                open_until DOUBLE PRECISION
+            );
+        """)
+        rows = await db.fetchall("""
+            SELECT rss_url, failures, last_success, last_failure, last_error, fetch_seconds, open_until
+            FROM feed_health;
+        """)
+        for rss_url, *state in rows:
+            self._states.setdefault(rss_url, FeedState(*state))
+        logger.info("Loaded the health of %d feeds, %d of them failing", len(rows), self.open_circuits())
+
+    def state(self, rss_url: str) -> Optional[FeedState]:
+        return self._states.get(rss_url)
+
+    def blocked_for(self, rss_url: str) -> float:
+        """Seconds until the feed may be polled again; 0 unless its circuit is open"""
+        state = self._states.get(rss_url)
+        if state is None or state.open_until is None:
+            return 0.0
+        return max(state.open_until - time.time(), 0.0)
+
+    def open_circuits(self) -> int:
+        return sum(1 for state in self._states.values() if state.open_until is not None)
+
+    def _state(self, rss_url: str) -> FeedState:
+        self._dirty.add(rss_url)
+        self._deleted.discard(rss_url)
+        return self._states.setdefault(rss_url, FeedState())
+
+    def record_success(self, rss_url: str, fetch_seconds: float) -> None:
+        state = self._state(rss_url)
+        if state.open_until is not None:
+            logger.info("Feed %s is back after %d failed polls", rss_url, state.failures)
+        state.failures = 0
+        state.open_until = None
+        state.last_success = time.time()
+        state.observe_fetch(fetch_seconds)
+
+    def record_failure(self, rss_url: str, fetch_seconds: float, error: Exception) -> float:
+        """
+        Record a failed poll of the feed
+
+        :return: seconds the feed must not be polled, 0 while its circuit is closed
+        """
+        state = self._state(rss_url)
+        state.failures += 1
+        state.last_failure = time.time()
+        state.last_error = f"{type(error).__name__}: {error}"[:ERROR_MAX_CHARS]
+        state.observe_fetch(fetch_seconds)
+        if state.failures < self._threshold:
+            return 0.0
+        delay = min(self._probe_delay * 2 ** (state.failures - self._threshold), self._max_probe_delay)
+        state.open_until = state.last_failure + delay
+        logger.warning("Feed %s failed %d times in a row, next probe in %.0fs", rss_url, state.failures, delay)
+        return delay
+
+    def forget(self, rss_url: str) -> None:
+        """Drop the state of a deleted feed"""
+        if self._states.pop(rss_url, None) is not None:
+            self._dirty.discard(rss_url)
+            self._deleted.add(rss_url)
+
+    async def flush(self):
+        """Write the states changed since the last flush with one statement."""
+        dirty, self._dirty = [rss_url for rss_url in self._dirty if rss_url in self._states], set()
+        deleted, self._deleted = list(self._deleted), set()
+        if not dirty and not deleted:
+            return
+        states = [self._states[rss_url] for rss_url in dirty]
+        try:
+            async with db.batch() as batch:
+                if dirty:
+                    batch.add("""
+                        INSERT INTO feed_health
+                            (rss_url, failures, last_success, last_failure, last_error, fetch_seconds, open_until)
+                        SELECT * FROM unnest(%s::text[], %s::int[], %s::float8[], %s::float8[], %s::text[],
+                                             %s::float8[], %s::float8[])
+                        ON CONFLICT (rss_url) DO UPDATE
+                        SET failures = EXCLUDED.failures, last_success = EXCLUDED.last_success,
+                            last_failure = EXCLUDED.last_failure, last_error = EXCLUDED.last_error,
+                            fetch_seconds = EXCLUDED.fetch_seconds, open_until = EXCLUDED.open_until;
+                    """, (
+                        dirty,
+                        [state.failures for state in states],
+                        [state.last_success for state in states],
+                        [state.last_failure for state in states],
+                        [state.last_error for state in states],
+                        [state.fetch_seconds for state in states],
+                        [state.open_until for state in states],
+                    ))
+                if deleted:
+                    batch.add("DELETE FROM feed_health WHERE rss_url = ANY(%s);", (deleted,))
+        except Exception:
+            self._dirty.update(dirty)  # Written with the next flush
+            self._deleted.update(deleted)
+            raise
+
+    async def run(self) -> None:
+        """Flush the state every HEALTH_FLUSH_INTERVAL seconds forever"""
+        while True:
+            await asyncio.sleep(HEALTH_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.error("Failed to save the feed health: %s", exc)
+
+    async def report(self, names: Dict[str, str], limit: int = HEALTH_REPORT_SIZE) -> str:
+        """HTML list of the failing feeds of all workers, the ones failing longest first"""
+        await self.flush()
+        rows = await db.fetchall("""
+            SELECT rss_url, failures, last_success, last_error, fetch_seconds, open_until FROM feed_health
+            WHERE failures > 0 AND rss_url = ANY(%s)
+            ORDER BY failures DESC, rss_url;
+        """, (list(names),))
+        if not rows:
+            return f"All {len(names)} feeds are healthy."
+        now = time.time()
+        lines = [f"<b>{len(rows)} of {len(names)} feeds failing</b>"]
+        for rss_url, failures, last_success, last_error, fetch_seconds, open_until in rows[:limit]:
+            since = f"last success {_ago(now - last_success)} ago" if last_success else "never succeeded"
+            probe = f", next probe in {_ago(open_until - now)}" if open_until and open_until > now else ""
+            fetch = f", fetch {fetch_seconds:.1f}s" if fetch_seconds is not None else ""
+            lines.append(f"\n<b>{html.escape(names[rss_url])}</b> ({html.escape(rss_url)})\n"
+                         f"{failures} failures, {since}{fetch}{probe}\n<i>{html.escape(last_error or '')}</i>")
+        if len(rows) > limit:
+            lines.append(f"\n… and {len(rows) - limit} more")
+        return "\n".join(lines)
+
+
+def _ago(seconds: float) -> str:
+    seconds = max(seconds, 0)
+    for unit, size in (("d", 86400), ("h", 3600), ("min", 60)):
+        if seconds >= size:
+            return f"{seconds / size:.0f}{unit}"
+    return f"{seconds:.0f}s"
+
+
+feed_health: FeedHealth = FeedHealth()
+metrics.gauge("feeds_circuit_open", "Feeds not polled because they keep failing", feed_health.open_circuits)
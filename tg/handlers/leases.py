@@ -0,0 +1,206 @@
+"""
+Leases for running several workers against one database
+
+With FEED_SHARDING enabled every worker process leases its share of the feeds in the feed_leases table and only polls
+the feeds it holds. Leases expire after LEASE_TTL seconds unless renewed, so the feeds of a dead worker are taken over
+by the others, and the share is recomputed from the workers that sent a heartbeat recently, so the feeds are spread
+again when a worker joins or leaves. Claims are single conditional upserts, so two workers never hold the same feed.
+
+Posts are additionally claimed one by one in the publications table before they are sent, and the id of the sent
+message is recorded, so an article is posted once even if two workers picked it up during a lease handover.
+"""
+
+import asyncio
+import math
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Collection, Optional, Set, Tuple
+
+from core.config import LEASE_TTL, PUBLISH_CLAIM_TTL
+from core.db import db
+from core.logger import logger
+
+WORKER_ID = f"{os.environ.get('DYNO') or socket.gethostname()}-{os.getpid()}"
+
+
+class FeedLeases:
+    """The feeds leased by this worker, kept at its fair share by run()"""
+
+    def __init__(self, worker_id: str = WORKER_ID, ttl: float = LEASE_TTL) -> None:
+        self.worker_id = worker_id
+        self._ttl = ttl
+        self._owned: Set[str] = set()
+        self._renewed_at = 0.0
+
+    def __contains__(self, rss_url: str) -> bool:
+        return rss_url in self._owned
+
+    def __len__(self) -> int:
+        return len(self._owned)
+
+    async def init(self):
+        """Create the lease tables if they don't exist."""
+        async with db.transaction() as transaction:
+            await transaction.execute("""
+                CREATE TABLE IF NOT EXISTS feed_leases (
+                    rss_url TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at TIMESTAMP NOT NULL
+                );
+            """)
+            await transaction.execute("""
+                CREATE TABLE IF NOT EXISTS feed_workers (
+                    worker_id TEXT PRIMARY KEY,
+                    heartbeat_at TIMESTAMP NOT NULL
+                );
+            """)
+
+    async def _live_workers(self) -> int:
+        async with db.transaction() as transaction:
+            await transaction.execute("""
+                INSERT INTO feed_workers (worker_id, heartbeat_at) VALUES (%s, NOW() AT TIME ZONE 'utc')
+                ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = EXCLUDED.heartbeat_at;
+            """, (self.worker_id,))
+            await transaction.execute(
+                "DELETE FROM feed_workers WHERE heartbeat_at < (NOW() AT TIME ZONE 'utc') - make_interval(secs => %s);",
+                (self._ttl,))
+            row = await transaction.fetchone("SELECT COUNT(*) FROM feed_workers;")
+        return max(row[0], 1)
+
+    async def rebalance(self, feeds: Collection[str]) -> Tuple[Set[str], Set[str]]:
+        """
+        Renew the leases of this worker and claim or release feeds to hold its fair share
+
+        :return: the feeds acquired and the feeds lost since the previous call
+        """
+        feeds = sorted(set(feeds))
+        share = math.ceil(len(feeds) / await self._live_workers())
+        async with db.transaction() as transaction:
+            await transaction.execute("DELETE FROM feed_leases WHERE owner = %s AND NOT (rss_url = ANY(%s));",
+                                      (self.worker_id, feeds))
+            rows = await transaction.fetchall("""
+                UPDATE feed_leases SET expires_at = (NOW() AT TIME ZONE 'utc') + make_interval(secs => %s)
+                WHERE owner = %s RETURNING rss_url;
+            """, (self._ttl, self.worker_id))
+            owned = sorted(row[0] for row in rows)
+            if len(owned) > share:  # Another worker joined, hand the surplus over
+                surplus = owned[share:]
+                owned = owned[:share]
+                await transaction.execute("DELETE FROM feed_leases WHERE owner = %s AND rss_url = ANY(%s);",
+                                          (self.worker_id, surplus))
+            elif len(owned) < share:
+                rows = await transaction.fetchall("""
+                    INSERT INTO feed_leases (rss_url, owner, expires_at)
+                    SELECT free.rss_url, %s, (NOW() AT TIME ZONE 'utc') + make_interval(secs => %s)
+                    FROM (
+                        SELECT candidate.rss_url FROM unnest(%s::text[]) AS candidate (rss_url)
+                        LEFT JOIN feed_leases ON feed_leases.rss_url = candidate.rss_url
+                        WHERE feed_leases.rss_url IS NULL OR feed_leases.expires_at < NOW() AT TIME ZONE 'utc'
+                        LIMIT %s
+                    ) AS free
+                    ON CONFLICT (rss_url) DO UPDATE SET owner = EXCLUDED.owner, expires_at = EXCLUDED.expires_at
+                    WHERE feed_leases.expires_at < NOW() AT TIME ZONE 'utc'
+                    RETURNING rss_url;
+                """, (self.worker_id, self._ttl, feeds, share - len(owned)))
+                owned.extend(row[0] for row in rows)
+        self._renewed_at = time.monotonic()
+        previous, self._owned = self._owned, set(owned)
+        return self._owned - previous, previous - self._owned
+
+    def _expire(self) -> Set[str]:
+        """Give up every feed once the leases could not be renewed for a whole TTL, another worker may hold them"""
+        if not self._owned or time.monotonic() - self._renewed_at < self._ttl:
+            return set()
+        lost, self._owned = self._owned, set()
+        return lost
+
+    async def release(self):
+        """Hand every feed of this worker over right away, e.g. on shutdown."""
+        async with db.transaction() as transaction:
+            await transaction.execute("DELETE FROM feed_leases WHERE owner = %s;", (self.worker_id,))
+            await transaction.execute("DELETE FROM feed_workers WHERE worker_id = %s;", (self.worker_id,))
+        self._owned = set()
+
+    async def run(self, feeds: Callable[[], Awaitable[Collection[str]]], on_acquired: Callable[[str], None],
+                  on_lost: Callable[[str], None]) -> None:
+        """Rebalance the leases among the current feeds every third of the TTL, reporting the feeds acquired or lost"""
+        while True:
+            try:
+                acquired, lost = await self.rebalance(await feeds())
+            except Exception as exc:
+                logger.error("Failed to renew the feed leases of worker %s: %s", self.worker_id, exc)
+                acquired, lost = set(), self._expire()
+            if acquired or lost:
+                logger.info("Worker %s acquired %d and lost %d feeds, holds %d",
+                            self.worker_id, len(acquired), len(lost), len(self._owned))
+            for rss_url in lost:
+                on_lost(rss_url)
+            for rss_url in acquired:
+                on_acquired(rss_url)
+            await asyncio.sleep(self._ttl / 3)
+
+
+class PublicationLeases:
+    """Claims on the posts, so every article is sent by one worker only"""
+
+    def __init__(self, worker_id: str = WORKER_ID, ttl: float = PUBLISH_CLAIM_TTL) -> None:
+        self.worker_id = worker_id
+        self._ttl = ttl
+        self._active: Set[str] = set()  # Keys of the posts this process is sending
+
+    async def init(self):
+        """Create the publications table if it doesn't exist."""
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS publications (
+                article_key CHAR(40) PRIMARY KEY,
+                owner TEXT NOT NULL,
+                claimed_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc'),
+                message_id BIGINT
+            );
+        """)
+
+    async def claim(self, key: str) -> bool:
+        """
+        Claim the post of the article; False if it was sent or another worker or task is sending it
+
+        A claim of this worker that is not active anymore, e.g. after a failed send, may be claimed again right away,
+        the claims of other workers only once they expired. The claim is active until release().
+        """
+        if key in self._active:
+            return False
+        self._active.add(key)  # Before the query, so a second copy of the article in this process is turned away
+        try:
+            row = await db.fetchone("""
+                INSERT INTO publications (article_key, owner) VALUES (%s, %s)
+                ON CONFLICT (article_key) DO UPDATE
+                SET owner = EXCLUDED.owner, claimed_at = EXCLUDED.claimed_at
+                WHERE publications.message_id IS NULL AND (
+                    publications.owner = EXCLUDED.owner
+                    OR publications.claimed_at < (NOW() AT TIME ZONE 'utc') - make_interval(secs => %s)
+                )
+                RETURNING article_key;
+            """, (key, self.worker_id, self._ttl))
+        except BaseException:
+            self._active.discard(key)
+            raise
+        if row is None:
+            self._active.discard(key)
+        return row is not None
+
+    def release(self, key: str):
+        """End the active claim of the post, whether it was sent or not."""
+        self._active.discard(key)
+
+    async def complete(self, key: str, message_id: int):
+        """Record the message the article was posted as."""
+        await db.execute("UPDATE publications SET message_id = %s WHERE article_key = %s;", (message_id, key))
+
+    async def message_id(self, key: str) -> Optional[int]:
+        """Return the id of the message the article was posted as, None if it was not posted (yet)."""
+        row = await db.fetchone("SELECT message_id FROM publications WHERE article_key = %s;", (key,))
+        return row[0] if row else None
+
+
+feed_leases: FeedLeases = FeedLeases()
+publication_leases: PublicationLeases = PublicationLeases()
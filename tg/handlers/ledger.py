@@ -0,0 +1,88 @@
+"""
+Ledger of processed articles
+
+Every article that went through the pipeline (posted or filtered out) is recorded under a hash of its normalized
+GUID/URL. Deduplication of a whole feed is a single indexed lookup for all candidate entries at once.
+"""
+
+import hashlib
+from typing import Any, Dict, List, Mapping, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import pytz
+
+from core.db import WriteBatch, db
+from core.logger import logger
+from core.metrics import metrics
+
+TRACKING_PARAMS_PREFIXES = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")
+
+ALREADY_PROCESSED = metrics.counter("ledger_already_processed_total", "Feed entries skipped as already processed")
+
+
+def normalize_url(url: str) -> str:
+    """Lower-case scheme and host, drop the fragment, tracking parameters and the trailing slash"""
+    parts = urlsplit(url.strip())
+    query = urlencode([
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith(TRACKING_PARAMS_PREFIXES)
+    ])
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+
+def article_key(entry: Mapping[str, Any]) -> str:
+    """Stable key of a feed entry: the hash of its GUID, or of its normalized link if the GUID is missing"""
+    guid = entry.get("id") or entry.get("guid")
+    identity = guid.strip() if guid else normalize_url(entry.get("link", ""))
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+
+async def init_ledger():
+    """Create the ledger table and its indexes if they don't exist."""
+    async with db.transaction() as transaction:
+        await transaction.execute("""
+            CREATE TABLE IF NOT EXISTS processed_articles (
+                article_key CHAR(40) PRIMARY KEY,
+                rss_url TEXT NOT NULL,
+                title TEXT,
+                pub_date TIMESTAMP,
+                processed_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+            );
+        """)
+        await transaction.execute("""
+            CREATE INDEX IF NOT EXISTS processed_articles_rss_url_pub_date_idx
+            ON processed_articles (rss_url, pub_date DESC);
+        """)
+
+
+async def filter_unseen(articles: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Return the candidate articles of a feed that are not in the ledger yet, in their original order, with one query
+
+    :param articles: article dicts carrying their article_key() under "key"
+    """
+    if not articles:
+        return []
+    keys = [article["key"] for article in articles]
+    rows = await db.fetchall("SELECT article_key FROM processed_articles WHERE article_key = ANY(%s);", (keys,))
+    seen = {row[0] for row in rows}
+    unseen = []
+    for article in articles:
+        if article["key"] in seen:
+            ALREADY_PROCESSED.inc()
+            logger.debug("Article '%s' has already been processed. Skipping...", article['title'])
+        else:
+            seen.add(article["key"])  # The same entry twice in one feed is only processed once
+            unseen.append(article)
+    return unseen
+
+
+def mark_processed(batch: WriteBatch, rss_url: str, article: Dict[str, Any]):
+    """Record the article in the ledger as part of the current batch of writes."""
+    pub_date = article["pub_date"].astimezone(pytz.utc) if article.get("pub_date") else None
+    batch.add("""
+        INSERT INTO processed_articles (article_key, rss_url, title, pub_date)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (article_key) DO NOTHING;
+    """, (article["key"], rss_url, article["title"], pub_date))
@@ -0,0 +1,104 @@
+"""
+Content-addressed cache of LLM responses
+
+Responses are stored in the database under the hash of the whole request (model, prompt, content and sampling
+parameters), so a retry, a restart or a re-syndicated article with identical input costs no tokens. Entries expire
+after a TTL and the least recently used ones are evicted beyond the size limit.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from core.config import LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL
+from core.db import db
+from core.logger import logger
+from core.metrics import metrics
+
+EVICT_EVERY = 100  # Run the eviction after this many insertions
+
+
+class LLMCache:
+    """Database-backed response cache with TTL/size eviction and hit/miss counters"""
+
+    def __init__(self, ttl: int = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES) -> None:
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._puts_since_eviction = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(request: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    async def init(self):
+        """Create the cache table if it doesn't exist."""
+        async with db.transaction() as transaction:
+            await transaction.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    cache_key CHAR(64) PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc'),
+                    last_used_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+                );
+            """)
+            await transaction.execute("""
+                CREATE INDEX IF NOT EXISTS llm_cache_last_used_at_idx ON llm_cache (last_used_at);
+            """)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached response, or None if it is missing or expired. Errors count as a miss."""
+        try:
+            row = await db.fetchone("""
+                UPDATE llm_cache SET last_used_at = NOW() AT TIME ZONE 'utc'
+                WHERE cache_key = %s AND created_at > (NOW() AT TIME ZONE 'utc') - make_interval(secs => %s)
+                RETURNING response;
+            """, (key, self._ttl))
+        except Exception as exc:
+            logger.warning("LLM cache lookup failed: %s", exc)
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    async def put(self, key: str, response: str):
+        try:
+            await db.execute("""
+                INSERT INTO llm_cache (cache_key, response) VALUES (%s, %s)
+                ON CONFLICT (cache_key) DO UPDATE
+                SET response = EXCLUDED.response, created_at = EXCLUDED.created_at,
+                    last_used_at = EXCLUDED.last_used_at;
+            """, (key, response))
+            self._puts_since_eviction += 1
+            if self._puts_since_eviction >= EVICT_EVERY:
+                self._puts_since_eviction = 0
+                await self.evict()
+        except Exception as exc:
+            logger.warning("LLM cache store failed: %s", exc)
+
+    async def evict(self):
+        """Delete expired entries and the least recently used ones beyond the size limit."""
+        async with db.transaction() as transaction:
+            await transaction.execute(
+                "DELETE FROM llm_cache WHERE created_at <= (NOW() AT TIME ZONE 'utc') - make_interval(secs => %s);",
+                (self._ttl,))
+            await transaction.execute("""
+                DELETE FROM llm_cache WHERE cache_key IN (
+                    SELECT cache_key FROM llm_cache ORDER BY last_used_at DESC OFFSET %s
+                );
+            """, (self._max_entries,))
+        logger.info("LLM cache evicted; hit rate %.0f%% (%d hits, %d misses)",
+                    self.hit_rate * 100, self.hits, self.misses)
+
+
+llm_cache: LLMCache = LLMCache()
+metrics.gauge("llm_cache_hits", "LLM responses served from the cache", lambda: llm_cache.hits)
+metrics.gauge("llm_cache_misses", "LLM requests not found in the cache", lambda: llm_cache.misses)
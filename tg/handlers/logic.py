@@ -1,71 +1,144 @@
 # Initialize OpenAI
 import asyncio
-import datetime
 import json
 import os
-from typing import Dict, Optional, Any
+import re
+import time
+from typing import Dict, List, Optional, Any, Set
 
-import feedparser
 import openai
-import psycopg2
 import pytz
-import requests
-import tiktoken
 from aiohttp import ClientSession
-from bs4 import BeautifulSoup
-from dateutil import parser
-from telegram import Bot
-from telegram.constants import ParseMode
-
-from core import PROJECT_ROOT
+from telegram import Message
+
+from core.config import (
+    CLASSIFY_BATCH_SIZE,
+    CLASSIFY_BATCH_TOKEN_BUDGET,
+    CLASSIFY_BATCH_WAIT,
+    DRAIN_TIMEOUT,
+    FEED_SHARDING,
+    LEASE_TTL,
+    LLM_COMPLETION_ESTIMATE,
+    LLM_DEADLINE_CLASSIFY,
+    LLM_DEADLINE_SUMMARY,
+    LLM_RATE_LIMIT_PAUSE,
+    METRICS_HOST,
+    METRICS_PORT,
+    PIPELINE_LLM_WORKERS,
+    PIPELINE_PUBLISH_WORKERS,
+    PIPELINE_SCRAPE_WORKERS,
+    SUMMARY_MODE,
+    TOKEN_BUDGET_CLASSIFY,
+    TOKEN_BUDGET_SUMMARY,
+    TOKEN_BUDGET_SUMMARY_CHUNK,
+)
+from core.db import WriteBatch, db
 from core.logger import logger
+from core.metrics import metrics, serve_metrics
+from core.supervisor import Supervisor
+from tg.handlers.batcher import MicroBatcher
+from tg.handlers.checkpoints import (
+    checkpoint_submitted,
+    clear_checkpoint,
+    init_checkpoints,
+    load_checkpoints,
+    record_failure,
+    resume_articles,
+    save_checkpoint,
+)
+from tg.handlers.extractor import extract_article
+from tg.handlers.fetcher import feed_fetcher
+from tg.handlers.formatting import format_post
+from tg.handlers.governor import PRIORITY_CLASSIFY, PRIORITY_NAMES, PRIORITY_SUMMARY, DeadlineExceeded, llm_governor
+from tg.handlers.health import feed_health
+from tg.handlers.leases import feed_leases, publication_leases
+from tg.handlers.ledger import article_key, filter_unseen, init_ledger, mark_processed
+from tg.handlers.llm_cache import llm_cache
+from tg.handlers.near_dup import near_duplicates
+from tg.handlers.parsing import parser_pool
+from tg.handlers.pipeline import Pipeline
+from tg.handlers.prefilter import prefilter_article
+from tg.handlers.publisher import TelegramPublisher
+from tg.handlers.registry import feed_registry
+from tg.handlers.resolver import url_resolver
+from tg.handlers.scheduler import feed_scheduler
+from tg.handlers.tokens import count_tokens, split_to_budget, truncate_to_budget
+from tg.parsers import parse_pub_date
 
 openai.api_key = os.environ.get('OPENAI_API_KEY')
 TELEGRAM_TOKEN = os.environ.get('BOT_TOKEN')
 TELEGRAM_CHANNEL = '@ai3daily'
+telegram_publisher = TelegramPublisher(token=TELEGRAM_TOKEN, chat_id=TELEGRAM_CHANNEL)
+
+RETRY_COUNT = 3  # Number of times to retry a failed stage of an article
+RETRY_DELAY = 5  # Seconds to wait before retrying a failed stage, doubled on every further attempt
+
+_articles_in_flight: Set[str] = set()  # Keys of the articles currently in the pipeline
 
-RETRY_COUNT = 3  # Number of times to retry processing an article if it fails
-DATABASE_URL = os.environ.get('DATABASE_URL')
-conn = psycopg2.connect(DATABASE_URL, sslmode='require')
+LLM_SECONDS = metrics.histogram("llm_request_seconds", "Duration of an OpenAI request, waiting for a slot excluded")
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Tokens used by OpenAI requests")
 
 
-def init_db():
+async def init_db():
     """Initialize the database and create the table if it doesn't exist."""
-    with conn.cursor() as cursor:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS latest_articles (
-                rss_url TEXT PRIMARY KEY,
-                pub_date TIMESTAMP,
-                title TEXT
-            );
-        """)
-    conn.commit()
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS latest_articles (
+            rss_url TEXT PRIMARY KEY,
+            pub_date TIMESTAMP,
+            title TEXT
+        );
+    """)
+    await init_ledger()
+    await init_checkpoints()
+    await feed_registry.init()
+    await feed_leases.init()
+    await publication_leases.init()
+    await feed_health.init()
+    await llm_cache.init()
+    await near_duplicates.init()
     logger.info("Database initialized and table created if not exists.")
 
 
-def get_latest_article_from_db(rss_url: str) -> Optional[Dict[str, Any]]:
+async def get_latest_article_from_db(rss_url: str) -> Optional[Dict[str, Any]]:
     """Get the latest article's title and date from the database for a given RSS URL."""
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT pub_date, title FROM latest_articles WHERE rss_url = %s;", (rss_url,))
-        result = cursor.fetchone()
-        if result:
-            return {"pub_date": result[0], "title": result[1]}
+    result = await db.fetchone("SELECT pub_date, title FROM latest_articles WHERE rss_url = %s;", (rss_url,))
+    if result:
+        return {"pub_date": result[0], "title": result[1]}
     return None
 
 
-def is_article_processed(title: str) -> bool:
-    """Check if the article with the given title has already been processed."""
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT COUNT(*) FROM latest_articles WHERE title = %s;", (title,))
-        count = cursor.fetchone()[0]
-        if count > 0:
-            logger.info(f"Article '{title}' has already been processed.")
-        else:
-            logger.info(f"Article '{title}' has not been processed yet.")
-        return count > 0
+async def create_chat_completion(data: Dict[str, Any], priority: int = PRIORITY_SUMMARY) -> str:
+    """
+    Return the answer to the chat completion request, from the cache if the same request was answered before.
+
+    Requests sent to the API wait for a slot of the LLM governor, classification before summarization.
+    """
+    key = llm_cache.key(data)
+    answer = await llm_cache.get(key)
+    if answer is None:
+        estimate = sum(tiktoken_len(message["content"]) for message in data["messages"]) + LLM_COMPLETION_ESTIMATE
+        deadline = LLM_DEADLINE_CLASSIFY if priority == PRIORITY_CLASSIFY else LLM_DEADLINE_SUMMARY
+        call = PRIORITY_NAMES[priority]
+        async with llm_governor.slot(estimate, priority, deadline) as ticket:
+            try:
+                with LLM_SECONDS.time(call=call):
+                    response = await asyncio.wait_for(openai.ChatCompletion.acreate(**data), ticket.remaining)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(f"No LLM answer within {deadline:.0f}s") from None
+            except openai.error.RateLimitError as exc:
+                retry_after = (exc.headers or {}).get("retry-after") or ""
+                llm_governor.pause(float(retry_after) if retry_after.isdigit() else LLM_RATE_LIMIT_PAUSE)
+                raise
+        tokens = response.get('usage', {}).get('total_tokens', estimate)
+        llm_governor.settle(ticket, tokens)
+        LLM_TOKENS.inc(tokens, call=call)
+        answer = response['choices'][0]['message']['content']
+        await llm_cache.put(key, answer)
+    return answer
 
 
 async def is_article_related_to_ai(title: str, content: str) -> bool:
+    content = truncate_to_budget(content, TOKEN_BUDGET_CLASSIFY)
     data = {
         "model": "gpt-3.5-turbo-16k",
         "messages": [
@@ -81,17 +154,87 @@ async def is_article_related_to_ai(title: str, content: str) -> bool:
             }
         ]
     }
-    response = await openai.ChatCompletion.acreate(**data)
-    answer = response['choices'][0]['message']['content']
-    logger.info(answer)
+    answer = await create_chat_completion(data, priority=PRIORITY_CLASSIFY)
+    logger.debug("Classification answer: %s", answer)
     return answer.strip().lower() == 'true'
 
 
-def get_final_url(url: str) -> str:
-    if "news.google.com" in url:
-        response = requests.get(url, allow_redirects=True)
-        return response.url
-    return url
+def pack_articles(articles: List[Dict[str, Any]], token_budget: int) -> List[List[Dict[str, Any]]]:
+    """Split the articles into consecutive chunks whose truncated content fits into the token budget."""
+    chunks, chunk, chunk_tokens = [], [], 0
+    for article in articles:
+        content = truncate_to_budget(article['content'], TOKEN_BUDGET_CLASSIFY)
+        tokens = tiktoken_len(article['title']) + tiktoken_len(content)
+        if chunk and chunk_tokens + tokens > token_budget:
+            chunks.append(chunk)
+            chunk, chunk_tokens = [], 0
+        chunk.append(article)
+        chunk_tokens += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def parse_batch_verdicts(answer: str, count: int) -> Optional[List[bool]]:
+    """Parse a {"1": true, "2": false, ...} verdict object; None if it is malformed or incomplete."""
+    match = re.search(r"\{.*\}", answer, re.DOTALL)
+    if not match:
+        return None
+    try:
+        parsed = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    verdicts = [parsed.get(str(number)) for number in range(1, count + 1)]
+    if not all(isinstance(verdict, bool) for verdict in verdicts):
+        return None
+    return verdicts
+
+
+async def classify_chunk(articles: List[Dict[str, Any]]) -> List[bool]:
+    if len(articles) == 1:
+        return [await is_article_related_to_ai(articles[0]['title'], articles[0]['content'])]
+    numbered_articles = "\n\n".join(
+        f"Article {number}. Title: {article['title']}. "
+        f"Content: {truncate_to_budget(article['content'], TOKEN_BUDGET_CLASSIFY)}"
+        for number, article in enumerate(articles, start=1)
+    )
+    data = {
+        "model": "gpt-3.5-turbo-16k",
+        "messages": [
+            {
+                "role": "system",
+                "content": "You are a filter bot. Determine for each of the numbered articles below if its title and "
+                           "content are related to AI, ML, DL. Try to be precise to filter all articles out, which "
+                           "are not related to AI. Answer only with a JSON object that maps every article number to "
+                           "true if it is related and false if not, e.g. {\"1\": true, \"2\": false}."
+            },
+            {
+                "role": "user",
+                "content": numbered_articles
+            }
+        ]
+    }
+    answer = await create_chat_completion(data, priority=PRIORITY_CLASSIFY)
+    verdicts = parse_batch_verdicts(answer, len(articles))
+    if verdicts is None:
+        logger.warning("Could not parse the batch verdict, classifying %d articles one by one: %s",
+                       len(articles), answer)
+        verdicts = list(await asyncio.gather(*(
+            is_article_related_to_ai(article['title'], article['content']) for article in articles
+        )))
+    return verdicts
+
+
+async def are_articles_related_to_ai(articles: List[Dict[str, Any]]) -> List[bool]:
+    """Classify many articles with as few requests as the token budget allows."""
+    verdicts = []
+    for chunk in pack_articles(articles, CLASSIFY_BATCH_TOKEN_BUDGET):
+        verdicts.extend(await classify_chunk(chunk))
+    return verdicts
+
+
+relevance_batcher: MicroBatcher = MicroBatcher(are_articles_related_to_ai, max_size=CLASSIFY_BATCH_SIZE,
+                                               max_wait=CLASSIFY_BATCH_WAIT)
 
 
 def sanitize_text_for_telegram(text: str) -> str:
@@ -99,62 +242,81 @@ def sanitize_text_for_telegram(text: str) -> str:
     return sanitized_text
 
 
-def extract_largest_text_block(soup: BeautifulSoup) -> str:
-    paragraphs = soup.find_all('p')
-    largest_block = ""
-    current_block = ""
-    for paragraph in paragraphs:
-        if len(paragraph.text) > 50:
-            current_block += paragraph.text + "\n"
-        else:
-            if len(current_block) > len(largest_block):
-                largest_block = current_block
-            current_block = ""
-    return largest_block.strip()
-
-
-async def send_to_telegram(news_object: Dict[str, str]):
-    logger.info(f"Sending news: {news_object['title']} to Telegram...")
-    bot = Bot(token=TELEGRAM_TOKEN)
+async def send_to_telegram(news_object: Dict[str, str]) -> Message:
+    logger.info("Sending news: %s to Telegram...", news_object['title'])
     sanitized_summary = news_object['summary'].replace("<the>", "").replace("</the>", "")
     sanitized_title = sanitize_text_for_telegram(news_object['title'])
     caption = f"<b>{sanitized_title}</b>\n\n{sanitized_summary}\n\n<a href='{news_object['url']}'>Read More</a>"
-    if news_object['image']:
-        await bot.send_photo(chat_id=TELEGRAM_CHANNEL, photo=news_object['image'], caption=caption,
-                             parse_mode=ParseMode.HTML)
-    else:
-        await bot.send_message(chat_id=TELEGRAM_CHANNEL, text=caption, parse_mode=ParseMode.HTML)
+    return await telegram_publisher.publish(caption, news_object['image'])
 
 
 def tiktoken_len(text: str) -> int:
-    tokenizer = tiktoken.get_encoding('cl100k_base')
-    tokens = tokenizer.encode(text, disallowed_special=())
-    return len(tokens)
-
+    return count_tokens(text)
+
+
+async def condense_content(title: str, content: str) -> str:
+    """Map-reduce step for long articles: condense every chunk to its key facts and return the joined notes."""
+    if tiktoken_len(content) <= TOKEN_BUDGET_SUMMARY:
+        return content
+    chunks = split_to_budget(content, TOKEN_BUDGET_SUMMARY_CHUNK)
+    logger.info("Condensing %d chunks of the article: %s...", len(chunks), title)
+
+    async def condense_chunk(chunk: str) -> str:
+        return await create_chat_completion({
+            "model": "gpt-3.5-turbo-16k",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You take notes for a news editor. List the key facts, names and numbers of the given "
+                               "part of an article in a few short sentences. Do not add anything that is not in it."
+                },
+                {
+                    "role": "user",
+                    "content": f"News Title: {title}. Part of the News Content: {chunk}"
+                }
+            ],
+            "temperature": 0,
+            "max_tokens": 300
+        })
 
-async def summarize_content(session: ClientSession, title: str, content: str) -> str:
-    logger.info(f"Summarizing content for title: {title}...")
-    data = {
+    notes = await asyncio.gather(*(condense_chunk(chunk) for chunk in chunks))
+    return truncate_to_budget("\n".join(notes), TOKEN_BUDGET_SUMMARY)
+
+
+SUMMARY_PERSONA_PROMPT = (
+    "You are Richard Rex, a witty AI engineer from PwC. Your specialty is turning AI news "
+    "into engaging telegram posts filled with humor, sarcasm, and insight. Your responses "
+    "should be a blend of the following moods:\n\n"
+    "- **Cheerful**: Light-hearted and optimistic.\n"
+    "- **Sarcastic**: Pointed wit, highlighting ironies.\n"
+    "- **Contemplative**: Thoughtful with a humorous twist.\n"
+    "- **Humorous**: Bursting with laughter and playful comparisons.\n"
+    "- **Serious**: Solemn, but with a sprinkle of sarcasm.\n\n"
+    "Your goal is to craft concise responses, ideally 100-150 words, that captivate and entertain. "
+    "Remember, the mood is just for guidance; your final post should not mention it."
+)
+SUMMARY_TASK_PROMPT = (
+    "Your task is to condense the news into a telegram post that's both engaging and concise, "
+    "averaging around 100 tokens. Based on the sentiment of the AI news, select the most fitting "
+    "emotion for your response. However, don't mention the chosen mood in your final post."
+)
+SUMMARY_FORMAT_PROMPT = (
+    " Highlight key points with bold <b>tags</b> for emphasis. Use no other HTML tags and no Markdown. "
+    "No emojis, please."
+)
+
+
+def build_summary_request(title: str, content: str, task_prompt: str) -> Dict[str, Any]:
+    return {
         "model": "gpt-3.5-turbo-16k",
         "messages": [
             {
                 "role": "system",
-                "content": ("You are Richard Rex, a witty AI engineer from PwC. Your specialty is turning AI news "
-                            "into engaging telegram posts filled with humor, sarcasm, and insight. Your responses "
-                            "should be a blend of the following moods:\n\n"
-                            "- **Cheerful**: Light-hearted and optimistic.\n"
-                            "- **Sarcastic**: Pointed wit, highlighting ironies.\n"
-                            "- **Contemplative**: Thoughtful with a humorous twist.\n"
-                            "- **Humorous**: Bursting with laughter and playful comparisons.\n"
-                            "- **Serious**: Solemn, but with a sprinkle of sarcasm.\n\n"
-                            "Your goal is to craft concise responses, ideally 100-150 words, that captivate and entertain. "
-                            "Remember, the mood is just for guidance; your final post should not mention it.")
+                "content": SUMMARY_PERSONA_PROMPT
             },
             {
                 "role": "system",
-                "content": ("Your task is to condense the news into a telegram post that's both engaging and concise, "
-                            "averaging around 100 tokens. Based on the sentiment of the AI news, select the most fitting "
-                            "emotion for your response. However, don't mention the chosen mood in your final post.")
+                "content": task_prompt
             },
             {
                 "role": "user",
@@ -168,53 +330,75 @@ async def summarize_content(session: ClientSession, title: str, content: str) ->
         "presence_penalty": 1
     }
 
-    response = await openai.ChatCompletion.acreate(**data)
-    summary = response['choices'][0]['message']['content']
-
-    # Second request
-    data["messages"][1]["content"] = (f"Refine the text below to make it more suitable for a telegram channel post. "
-                                      f"Highlight key points with bold <b>tags</b> for emphasis. Ensure the content remains "
-                                      f"intact, but if multiple moods are presented, select the most fitting one and remove "
-                                      f"any mention of it. No emojis, please.\nNew Post: {summary}")
 
-    response = await openai.ChatCompletion.acreate(**data)
-    bolded_summary = response['choices'][0]['message']['content']
-    print(bolded_summary)
-    return bolded_summary
+def request_tokens(data: Dict[str, Any], answer: str) -> int:
+    """Estimate the prompt plus completion tokens of a chat completion request."""
+    return sum(tiktoken_len(message["content"]) for message in data["messages"]) + tiktoken_len(answer)
 
 
-def parse_pub_date(pub_date_str: str) -> datetime.datetime:
-    if isinstance(pub_date_str, str):
-        parsed_date = parser.parse(pub_date_str)
-    elif isinstance(pub_date_str, datetime.datetime):
-        parsed_date = pub_date_str
+async def summarize_content(session: ClientSession, title: str, content: str) -> str:
+    """
+    Write the channel post for the article in the configured SUMMARY_MODE
+
+    "refine" drafts the post and refines it with a second request, "single" writes the final post in one request.
+    Both are finished by format_post(), and the latency and token use of the mode are logged for comparison.
+    """
+    logger.info("Summarizing content for title: %s...", title)
+    content = await condense_content(title, content)
+    started = time.perf_counter()
+
+    if SUMMARY_MODE == "single":
+        data = build_summary_request(title, content, SUMMARY_TASK_PROMPT + SUMMARY_FORMAT_PROMPT)
+        summary = await create_chat_completion(data)
+        tokens = request_tokens(data, summary)
     else:
-        raise ValueError(f"Unexpected type for pub_date_str: {type(pub_date_str)}")
-
-    # Convert the parsed date to UTC timezone
-    parsed_date_utc = parsed_date.astimezone(pytz.utc)
-    return parsed_date_utc
-
-
-def article_exists_in_db(title: str) -> bool:
-    """Check if an article exists in the database based on its title."""
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT COUNT(*) FROM latest_articles WHERE title = %s;", (title,))
-        count = cursor.fetchone()[0]
-        return count > 0
-
-
-async def fetch_latest_article_from_rss(session: ClientSession, rss_url: str, latest_pub_date) -> Optional[
-    Dict[str, Any]]:
-    logger.info(f"Fetching latest article from RSS: {rss_url}...")
-    feed = feedparser.parse(rss_url)
-    articles = []
-    for entry in feed.entries[:2]:
+        data = build_summary_request(title, content, SUMMARY_TASK_PROMPT)
+        draft = await create_chat_completion(data)
+        tokens = request_tokens(data, draft)
+
+        # Second request
+        data = build_summary_request(title, content, (
+            f"Refine the text below to make it more suitable for a telegram channel post. "
+            f"Highlight key points with bold <b>tags</b> for emphasis. Ensure the content remains "
+            f"intact, but if multiple moods are presented, select the most fitting one and remove "
+            f"any mention of it. No emojis, please.\nNew Post: {draft}"
+        ))
+        summary = await create_chat_completion(data)
+        tokens += request_tokens(data, summary)
+
+    logger.info("Summary of '%s' in %s mode took %.2fs and ~%d tokens",
+                title, SUMMARY_MODE, time.perf_counter() - started, tokens)
+    return format_post(summary)
+
+
+async def fetch_new_articles_from_rss(session: ClientSession, rss_url: str, latest_pub_date) -> List[Dict[str, Any]]:
+    """Return the unseen entries of the feed newer than latest_pub_date, oldest first, without their content."""
+    logger.debug("Fetching new articles from RSS: %s...", rss_url)
+    started = time.perf_counter()
+    try:
+        entries = await feed_fetcher.fetch(session, rss_url)
+        if entries and not any('title' in entry and entry["pub_date"] for entry in entries):
+            raise ValueError(f"None of the {len(entries)} entries has a title and a valid publication date")
+    except Exception as exc:
+        feed_fetcher.forget(rss_url)  # A malformed feed must be parsed again, not answered with a 304
+        feed_scheduler.hold(rss_url, feed_health.record_failure(rss_url, time.perf_counter() - started, exc))
+        raise
+    feed_health.record_success(rss_url, time.perf_counter() - started)
+    if entries is None:
+        return []
+    feed_scheduler.observe(rss_url, [entry["pub_date"] for entry in entries if entry["pub_date"]])
+    candidates = []
+    for entry in entries:
         if 'title' not in entry:
-            logger.error(f"Missing 'title' key in RSS entry for URL: {rss_url}")
+            logger.error("Missing 'title' key in RSS entry for URL: %s", rss_url)
             continue
-        pub_date = parse_pub_date(entry.published)
-        logger.info(f"Debugging: Parsed pub_date: {pub_date}")
+        if entry["pub_date"] is None:
+            logger.error("Missing 'published' key in RSS entry for URL: %s", rss_url)
+            continue
+        if not entry.get("link"):
+            logger.error("Missing 'link' key in RSS entry for URL: %s", rss_url)
+            continue
+        pub_date = entry["pub_date"]
 
         # Ensure latest_pub_date is in UTC before comparing
         if latest_pub_date:
@@ -223,157 +407,332 @@ async def fetch_latest_article_from_rss(session: ClientSession, rss_url: str, la
             # Ensure the latest_pub_date is timezone-aware
             if latest_pub_date.tzinfo is None or latest_pub_date.tzinfo.utcoffset(latest_pub_date) is None:
                 latest_pub_date = pytz.utc.localize(latest_pub_date)
-        logger.info(f"Debugging: Latest pub_date after processing: {latest_pub_date}")
 
         if latest_pub_date and pub_date <= latest_pub_date:
-            logger.info(
-                f"Debugging: Skipping article with pub_date {pub_date} as it's older or equal to latest pub_date {latest_pub_date}")
             continue
-        title = entry.title
-        link = entry.link
-        final_link = get_final_url(link)
-        page_response = await session.get(final_link)
-        soup = BeautifulSoup(await page_response.text(), 'html.parser')
-        content = extract_largest_text_block(soup)
-        image_div = soup.find('figure', {'class': 'article__lead__image'})
-        image_url = image_div.find('img')['src'] if image_div else None
-        articles.append({
-            "title": title,
-            "link": link,
-            "content": content,
-            "pub_date": pub_date,
-            "image": image_url
+        candidates.append({
+            "key": article_key(entry),
+            "rss_url": rss_url,
+            "title": entry["title"],
+            "link": entry["link"],
+            "pub_date": pub_date
         })
-    return articles[0] if articles else None
+
+    candidates.sort(key=lambda article: article["pub_date"])
+    if not latest_pub_date:
+        # Without a known latest date every entry would look new, so only the newest one is taken, never an older one
+        return await filter_unseen(candidates[-1:])
+    return await filter_unseen(candidates)  # All of them; a burst waits for room in the pipeline, none is dropped
+
+
+async def scrape_article(session: ClientSession, article: Dict[str, Any]) -> Dict[str, Any]:
+    """Download the article page and add its content and lead image to the article."""
+    async with url_resolver.open_final(session, article["link"]) as page_response:
+        article["content"], article["image"] = await extract_article(page_response)
+    return article
 
 
-def save_article_to_db(rss_url: str, article: Dict[str, Any]):
+async def save_article_to_db(batch: WriteBatch, rss_url: str, article: Dict[str, Any]):
+    """Add the article to the batch of writes of the current polling cycle."""
     pub_date_utc = article["pub_date"].astimezone(pytz.utc)
-    if not article_exists_in_db(article["title"]):
-        with conn.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO latest_articles (rss_url, pub_date, title)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (rss_url) DO UPDATE
-                SET pub_date = %s, title = %s;
-            """, (rss_url, pub_date_utc, article["title"], pub_date_utc, article["title"]))
-        conn.commit()
-        logger.info(f"Saved article '{article['title']}' with date '{article['pub_date']}' to the database.")
+    mark_processed(batch, rss_url, article)
+    clear_checkpoint(batch, article)
+    batch.add("""
+        INSERT INTO latest_articles (rss_url, pub_date, title)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (rss_url) DO UPDATE
+        SET pub_date = %s, title = %s;
+    """, (rss_url, pub_date_utc, article["title"], pub_date_utc, article["title"]))
+    logger.info("Saved article '%s' with date '%s' to the database.", article['title'], article['pub_date'])
+
+
+async def save_article(article: Dict[str, Any]):
+    """Save a finished article in its own transaction."""
+    async with db.batch() as batch:
+        await save_article_to_db(batch, article["rss_url"], article)
+
+
+async def download_article(session: ClientSession, article: Dict[str, Any]) -> Dict[str, Any]:
+    if "content" not in article:  # Otherwise restored from the checkpoint
+        await scrape_article(session, article)
+        await save_checkpoint(article, "scrape")
+    return article
+
+
+async def classify_article(article: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if "verdict" not in article:
+        duplicate_of = await near_duplicates.claim(article)
+        if duplicate_of is not None:
+            logger.info("Skipping near-duplicate of an already seen story (%s): %s", duplicate_of, article['title'])
+            await save_article(article)
+            return None
+        is_related = prefilter_article(article['rss_url'], article['title'], article['content'])
+        if is_related is None:
+            is_related = await relevance_batcher.submit(article)
+        else:
+            logger.info("Pre-classified article '%s' locally as related to AI: %s", article['title'], is_related)
+        article["verdict"] = is_related
+        await save_checkpoint(article, "classify")
+    if not article["verdict"]:
+        logger.info("Skipping non-AI related article: %s", article['title'])
+        await save_article(article)
+        return None
+    logger.info("New article found: %s", article['title'])
+    return article
+
+
+async def summarize_article(session: ClientSession, article: Dict[str, Any]) -> Dict[str, Any]:
+    if "summary" not in article:
+        article["summary"] = await summarize_content(session, article['title'], article['content'])
+        await save_checkpoint(article, "summarize")
+    return article
+
+
+async def publish_article(article: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    news_object = {
+        "title": article['title'],
+        "url": article['link'],
+        "image": article['image'],
+        "summary": article['summary']
+    }
+    if "message_id" not in article:  # A post that is out already is not sent again when saving it failed
+        if await publication_leases.claim(article["key"]):
+            try:
+                message = await send_to_telegram(news_object)
+                article["message_id"] = message.message_id
+                await publication_leases.complete(article["key"], message.message_id)
+            finally:
+                publication_leases.release(article["key"])
+            await save_checkpoint(article, "publish")
+        else:
+            message_id = await publication_leases.message_id(article["key"])
+            if message_id is None:
+                logger.info("Article '%s' is being published by another worker or task. Skipping...", article['title'])
+                return None
+            article["message_id"] = message_id
+    await save_article(article)  # Save to DB
+    return article
+
+
+async def on_article_finished(article: Dict[str, Any], error: Optional[Exception]):
+    _articles_in_flight.discard(article["key"])
+    if error is None:
+        return
+    if await record_failure(article, error):
+        logger.error("Article '%s' failed %d times and is given up. Last error: %s",
+                     article['title'], article["attempts"], article["error"])
     else:
-        logger.info(f"Article '{article['title']}' already exists in the database. Skipping...")
+        # The article is not in the ledger, so the next poll picks it up again; it must see the full feed, not a 304
+        feed_fetcher.forget(article["rss_url"])
+
+
+def build_pipeline(session: ClientSession) -> Pipeline:
+    """Chain the processing stages of an article: scrape -> classify -> summarize -> publish."""
+    return (
+        Pipeline(retries=RETRY_COUNT, retry_delay=RETRY_DELAY, on_finish=on_article_finished,
+                 context=lambda article: {"feed": article["rss_url"], "article": article["key"]})
+        .stage("scrape", lambda article: download_article(session, article), concurrency=PIPELINE_SCRAPE_WORKERS)
+        .stage("classify", classify_article, concurrency=CLASSIFY_BATCH_SIZE)  # Workers mostly wait for their batch
+        .stage("summarize", lambda article: summarize_article(session, article), concurrency=PIPELINE_LLM_WORKERS)
+        .stage("publish", publish_article, concurrency=PIPELINE_PUBLISH_WORKERS)
+    )
+
+
+def take_in_flight(articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Mark the articles as in flight and return them, without the ones already in flight.
+
+    The check and the mark happen without an await in between, so a poll and a resume of the same feed never both take
+    an article.
+    """
+    taken = [article for article in articles if article["key"] not in _articles_in_flight]
+    _articles_in_flight.update(article["key"] for article in taken)
+    return taken
+
+
+def release_in_flight(articles: List[Dict[str, Any]]):
+    _articles_in_flight.difference_update(article["key"] for article in articles)
+
+
+async def submit_in_flight(pipeline: Pipeline, articles: List[Dict[str, Any]]):
+    """Submit the articles taken by take_in_flight(); the ones not submitted, e.g. on cancellation, are released."""
+    submitted = 0
+    try:
+        for article in articles:
+            await pipeline.submit(article)  # Waits while the pipeline is full
+            submitted += 1
+    finally:
+        release_in_flight(articles[submitted:])
 
 
-async def process_rss_url(session: ClientSession, rss_url: str, latest_pub_dates: Dict[str, Any],
+async def process_rss_url(session: ClientSession, pipeline: Pipeline, rss_url: str, latest_pub_dates: Dict[str, Any],
                           titles: Dict[str, str]):
-    logger.info(f"Processing RSS URL: {rss_url}...")
-    retries = 0
-    while retries < RETRY_COUNT:
-        try:
-            article = await fetch_latest_article_from_rss(session, rss_url, latest_pub_dates.get(rss_url))
-
-            # Check if the article is not None
-            if not article:
-                logger.info(f"No new articles found for RSS URL: {rss_url}. Skipping...")
-                return
-
-            # Check if the article has already been processed
-            if article_exists_in_db(article['title']):
-                logger.info(f"Article {article['title']} has already been processed. Skipping...")
-                return  # Skip the rest of the processing for this article
-
-            is_related = await is_article_related_to_ai(article['title'], article['content'])
-
-            if not is_related:
-                logger.info(f"Skipping non-AI related article: {article['title']}")
-                save_article_to_db(rss_url, article)
-                return
-            print(f"New article found: {article['title']}")
-            summary = await summarize_content(session, article['title'], article['content'])
-            news_object = {
-                "title": article['title'],
-                "url": article['link'],
-                "image": article['image'],
-                "summary": summary
-            }
-            await send_to_telegram(news_object)
-            save_article_to_db(rss_url, article)  # Save to DB
-            break
-        except Exception as e:
-            logger.error(f"Error processing RSS URL {rss_url}. Retrying... Error: {e}")
-            retries += 1
-            await asyncio.sleep(10)
+    """Feed every new article of the RSS feed into the pipeline."""
+    logger.debug("Processing RSS URL: %s...", rss_url)
+    articles = await fetch_new_articles_from_rss(session, rss_url, latest_pub_dates.get(rss_url))
+    if articles and not latest_pub_dates.get(rss_url):
+        latest_pub_dates[rss_url] = articles[-1]["pub_date"]  # The next polls only take entries newer than this one
+    articles = take_in_flight(articles)
+    if not articles:
+        logger.debug("No new articles found for RSS URL: %s. Skipping...", rss_url)
+        return
+    logger.info("Submitting %d new articles of RSS URL: %s", len(articles), rss_url)
+    try:
+        resumed = await resume_articles(articles)  # Articles that failed before continue where they stopped
+        await checkpoint_submitted(resumed)  # A restart resumes them, even before their download
+    except BaseException:
+        release_in_flight(articles)
+        raise
+    await submit_in_flight(pipeline, resumed)
 
 
 def load_rss_feeds():
-    with open(PROJECT_ROOT.joinpath("rss_feeds.json"), "r") as file:
-        return json.load(file)
+    return feed_registry.feeds()
+
 
+async def refresh_rss_feeds():
+    """Pick up the feeds added or deleted by other workers and return all feeds."""
+    await feed_registry.refresh()
+    return load_rss_feeds()
 
-def load_latest_pub_dates():
+
+async def load_latest_pub_dates():
     """Load the latest publication dates from the database."""
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT rss_url, pub_date FROM latest_articles;")
-        rows = cursor.fetchall()
-        return {row[0]: row[1] for row in rows}
-
-
-def save_latest_pub_dates(latest_pub_dates: Dict[str, datetime.datetime], titles: Dict[str, str]):
-    """Save the latest publication dates and titles to the database."""
-    with conn.cursor() as cursor:
-        for rss_url, pub_date in latest_pub_dates.items():
-            title = titles.get(rss_url)
-            if title is not None:  # Only update if title is not None
-                cursor.execute("""
-                    INSERT INTO latest_articles (rss_url, pub_date, title)
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (rss_url) DO UPDATE
-                    SET pub_date = %s, title = %s;
-                """, (rss_url, pub_date, title, pub_date, title))
-    conn.commit()
-
-
-async def store_latest_articles(session: ClientSession, rss_url: str, latest_pub_dates: Dict[str, Any],
-                                titles: Dict[str, str]):
-    """Store the latest articles from the RSS feed in the database."""
-    logger.info(f"Storing latest article from RSS: {rss_url}...")
-    article = await fetch_latest_article_from_rss(session, rss_url, latest_pub_dates.get(rss_url))
-    logger.info(article)
-    if article:
-        latest_pub_dates[rss_url] = article["pub_date"].isoformat()
-        titles[rss_url] = article["title"]
-        save_latest_pub_dates(latest_pub_dates, titles)  # Save to DB
-    else:
-        logger.warning(f"No new articles found for RSS: {rss_url}. Skipping database update.")
+    rows = await db.fetchall("SELECT rss_url, pub_date FROM latest_articles;")
+    return {row[0]: row[1] for row in rows}
+
+
+def save_latest_pub_dates(batch: WriteBatch, latest_articles: Dict[str, Dict[str, Any]]):
+    """Save the publication date and title of the latest article of the feeds without one, with one statement."""
+    if not latest_articles:
+        return
+    rss_urls = list(latest_articles)
+    batch.add("""
+        INSERT INTO latest_articles (rss_url, pub_date, title)
+        SELECT * FROM unnest(%s::text[], %s::timestamp[], %s::text[])
+        ON CONFLICT (rss_url) DO NOTHING;
+    """, (
+        rss_urls,
+        [latest_articles[rss_url]["pub_date"].astimezone(pytz.utc).replace(tzinfo=None) for rss_url in rss_urls],
+        [latest_articles[rss_url]["title"] for rss_url in rss_urls],
+    ))
+
+
+async def fetch_latest_entry(session: ClientSession, rss_url: str, latest_pub_date) -> Optional[Dict[str, Any]]:
+    """Return the newest unseen entry of the feed from the feed XML alone, without downloading its page."""
+    logger.debug("Reading latest entry of RSS: %s...", rss_url)
+    try:
+        articles = await fetch_new_articles_from_rss(session, rss_url, latest_pub_date)
+    except Exception as exc:
+        logger.error("Failed to read RSS: %s. Error: %s", rss_url, exc)
+        return None
+    if not articles:
+        logger.warning("No new articles found for RSS: %s. Skipping database update.", rss_url)
+        return None
+    return articles[-1]
 
 
 async def initialize_feeds():
-    """Initialize the feeds by storing the latest articles' date and title in the database."""
-    init_db()
-    rss_feeds = load_rss_feeds()
-    rss_urls = list(rss_feeds.keys())
-    latest_pub_dates = load_latest_pub_dates()
-    titles = {}  # Initialize an empty dictionary to store titles
+    """
+    Record the date and title of the latest entry of every new feed in the database, reading only the feeds.
+
+    A feed with a recorded date keeps it, so the entries published while the bot was down are still processed.
+    """
+    started = time.perf_counter()
+    await init_db()
+    latest_pub_dates = await load_latest_pub_dates()
+    rss_urls = [rss_url for rss_url in load_rss_feeds()
+                if rss_url not in latest_pub_dates and not feed_health.blocked_for(rss_url)]  # Not failing ones
 
     async with ClientSession() as session:
-        tasks = [store_latest_articles(session, rss_url, latest_pub_dates, titles) for rss_url in rss_urls]
-        await asyncio.gather(*tasks)
+        entries = await asyncio.gather(*(fetch_latest_entry(session, rss_url, None) for rss_url in rss_urls))
+    latest_articles = {rss_url: entry for rss_url, entry in zip(rss_urls, entries) if entry is not None}
+    async with db.batch() as batch:
+        save_latest_pub_dates(batch, latest_articles)
+
+    logger.info("Feeds initialized successfully in %.1fs, %d of %d new feeds recorded.",
+                time.perf_counter() - started, len(latest_articles), len(rss_urls))
+
 
-    logger.info("Feeds initialized successfully.")
+def on_feed_changed(rss_url: str, name: Optional[str]):
+    """Poll a newly added feed right away and stop polling a deleted one."""
+    if name is None:
+        logger.info("Unscheduling RSS URL: %s", rss_url)
+        feed_scheduler.remove(rss_url)
+        feed_fetcher.forget(rss_url)
+        feed_health.forget(rss_url)
+    elif not FEED_SHARDING:  # Otherwise the feed is scheduled by the worker that leases it
+        logger.info("Scheduling RSS URL: %s", rss_url)
+        feed_scheduler.add(rss_url)
 
 
-async def monitor_feed():
+INTAKE = "intake"  # Supervisor groups: polling and resuming feeds, and processing the articles
+PROCESSING = "processing"
+
+
+async def monitor_feed(supervisor: Supervisor):
+    """
+    Monitor the feeds with tasks of the supervisor until it is asked to stop, then drain the pipeline.
+
+    On stop no feed is polled anymore and the articles in the pipeline get DRAIN_TIMEOUT seconds to be published.
+    The ones that don't make it are not in the ledger yet and continue from their checkpoints on the next start.
+    """
     await initialize_feeds()
     logger.info("Starting to monitor feeds...")
-    rss_feeds = load_rss_feeds()
-    rss_urls = list(rss_feeds.keys())
-    latest_pub_dates = load_latest_pub_dates()
+    latest_pub_dates = await load_latest_pub_dates()
     titles = {}  # Initialize an empty dictionary to store titles
 
-    while True:
-        updated_rss_feeds = load_rss_feeds()
-        updated_rss_urls = list(updated_rss_feeds.keys())
-        rss_urls = [url for url in updated_rss_urls if url not in rss_urls] + rss_urls
-        async with ClientSession() as session:
-            tasks = [process_rss_url(session, rss_url, latest_pub_dates, titles) for rss_url in rss_urls]
-            await asyncio.gather(*tasks)
-        await asyncio.sleep(600)
+    feed_registry.subscribe(on_feed_changed)
+
+    async with ClientSession() as session:
+        openai.aiosession.set(session)  # The LLM requests share the connection pool of the downloads
+        pipeline = build_pipeline(session)
+
+        async def poll(rss_url: str):
+            await process_rss_url(session, pipeline, rss_url, latest_pub_dates, titles)
+
+        async def resume(rss_urls: Optional[List[str]] = None):
+            """Put the articles left unfinished by a previous run back into the pipeline."""
+            articles = take_in_flight(await load_checkpoints(rss_urls))
+            if articles:
+                logger.info("Resuming %d unfinished articles...", len(articles))
+            await submit_in_flight(pipeline, articles)
+
+        if FEED_SHARDING:
+            def on_lease_acquired(rss_url: str):
+                feed_scheduler.add(rss_url, delay=feed_health.blocked_for(rss_url))
+                # In its own task, the lease renewal must not wait for the pipeline
+                supervisor.start(f"resume {rss_url}", lambda: resume([rss_url]), group=INTAKE)
+
+            supervisor.start("feed leases", lambda: feed_leases.run(refresh_rss_feeds, on_lease_acquired,
+                                                                    feed_scheduler.remove), group=INTAKE)
+        else:
+            for rss_url in load_rss_feeds():
+                feed_scheduler.add(rss_url, delay=feed_health.blocked_for(rss_url))  # Failing feeds wait for a probe
+            supervisor.start("resume", resume, group=INTAKE)
+        supervisor.start("feed scheduler", lambda: feed_scheduler.run(poll), group=INTAKE)
+        supervisor.start("feed health", feed_health.run, group=INTAKE)
+        supervisor.start("pipeline", pipeline.run, group=PROCESSING)
+        supervisor.start("publisher", telegram_publisher.run, group=PROCESSING)
+        if METRICS_PORT:
+            supervisor.start("metrics", lambda: serve_metrics(METRICS_HOST, METRICS_PORT))
+        await supervisor.wait_for_stop()
+
+        logger.info("Draining %d articles in the pipeline...", len(_articles_in_flight))
+        await supervisor.stop(INTAKE)
+        try:
+            await asyncio.wait_for(pipeline.join(), DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("%d articles not finished within %.0fs, they continue from their checkpoints on the next "
+                           "start", len(_articles_in_flight), DRAIN_TIMEOUT)
+        await supervisor.stop(PROCESSING)
+        try:
+            await feed_health.flush()
+        except Exception as exc:
+            logger.error("Failed to save the feed health: %s", exc)
+        if FEED_SHARDING:
+            try:
+                await feed_leases.release()  # The other workers take the feeds over right away
+            except Exception as exc:
+                logger.error("Failed to release the feed leases, they expire within %ds: %s", LEASE_TTL, exc)
+    parser_pool.shutdown()
@@ -0,0 +1,195 @@
+"""
+Cross-feed near-duplicate story detection
+
+Every article is fingerprinted with a 64-bit SimHash over the words of its title and lead text. Fingerprints are split
+into bands that are indexed exactly, so any fingerprint within the Hamming distance threshold shares at least one band
+with the query (pigeonhole principle) and a lookup only compares a handful of candidates, however large the history.
+The index lives in memory and is persisted to the database, so a restart keeps the recent window. Several workers
+(FEED_SHARDING) add the fingerprints the others stored since the last check to their index before every check, and
+after storing their own fingerprint they give way to an earlier matching story stored meanwhile by another worker.
+"""
+
+import hashlib
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from core.config import FEED_SHARDING, NEAR_DUP_MAX_DISTANCE, NEAR_DUP_WINDOW
+from core.db import db
+from core.logger import logger
+from core.metrics import metrics
+
+FINGERPRINT_BITS = 64
+TITLE_WEIGHT = 3
+LEAD_WORDS = 100  # Words of the article content fingerprinted next to the title
+SYNC_OVERLAP = 10.0  # Seconds a sync looks back before the previous one, for rows stored while it ran
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _features(title: str, content: str) -> Counter:
+    """Weighted features: title words and word pairs weigh more than the words of the lead, which are rewritten more"""
+    title_words = _WORD.findall(title.lower())
+    lead_words = _WORD.findall(content.lower())[:LEAD_WORDS]
+    features: Counter = Counter()
+    for word in title_words:
+        features[word] += TITLE_WEIGHT
+    for first, second in zip(title_words, title_words[1:]):
+        features[f"{first} {second}"] += TITLE_WEIGHT
+    features.update(lead_words)
+    return features
+
+
+def simhash(title: str, content: str) -> int:
+    """64-bit SimHash of the title and the lead of the content"""
+    rows, total = [], 0
+    for feature, weight in _features(title, content).items():
+        row = format(int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big"), "064b")
+        rows.extend([row] * weight)
+        total += weight
+    # Count the set bits column by column, a bit is set when it is set in the (weighted) majority of the features
+    return int("".join("1" if 2 * column.count("1") > total else "0" for column in zip(*rows)) or "0", 2)
+
+
+class NearDuplicateIndex:
+    """Banded index of fingerprints seen within the time window"""
+
+    def __init__(self, window: float = NEAR_DUP_WINDOW, max_distance: int = NEAR_DUP_MAX_DISTANCE) -> None:
+        self._window = window
+        self._max_distance = max_distance
+        self._bands = max_distance + 1
+        self._band_bits = FINGERPRINT_BITS // self._bands
+        self._buckets: List[Dict[int, Set[str]]] = [{} for _ in range(self._bands)]
+        self._entries: Dict[str, Tuple[int, float]] = {}  # article key -> (fingerprint, seen at)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_values(self, fingerprint: int) -> List[int]:
+        mask = (1 << self._band_bits) - 1
+        return [fingerprint >> (band * self._band_bits) & mask for band in range(self._bands)]
+
+    def add(self, key: str, fingerprint: int, seen_at: float) -> None:
+        self.remove(key)
+        self._entries[key] = (fingerprint, seen_at)
+        for band, value in enumerate(self._band_values(fingerprint)):
+            self._buckets[band].setdefault(value, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band, value in enumerate(self._band_values(entry[0])):
+            bucket = self._buckets[band].get(value)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][value]
+
+    def find(self, fingerprint: int, now: float, exclude_key: Optional[str] = None,
+             seen_before: Optional[Tuple[float, str]] = None) -> Optional[str]:
+        """Return the key of a near-duplicate seen within the window, if any, and before seen_before (time, key)"""
+        for band, value in enumerate(self._band_values(fingerprint)):
+            for key in self._buckets[band].get(value, ()):
+                if key == exclude_key:
+                    continue
+                candidate, seen_at = self._entries[key]
+                if seen_before is not None and (seen_at, key) >= seen_before:
+                    continue
+                if now - seen_at <= self._window and bin(candidate ^ fingerprint).count("1") <= self._max_distance:
+                    return key
+        return None
+
+    def prune(self, now: float) -> None:
+        """Drop the fingerprints that left the time window"""
+        for key in [key for key, (_, seen_at) in self._entries.items() if now - seen_at > self._window]:
+            self.remove(key)
+
+
+def _to_signed(fingerprint: int) -> int:
+    return fingerprint - (1 << FINGERPRINT_BITS) if fingerprint >= 1 << (FINGERPRINT_BITS - 1) else fingerprint
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << FINGERPRINT_BITS) if value < 0 else value
+
+
+class NearDuplicateDetector:
+    """The in-memory index, loaded from and persisted to the database, and synced with it if `shared`"""
+
+    def __init__(self, index: Optional[NearDuplicateIndex] = None, shared: bool = FEED_SHARDING) -> None:
+        self.index = index or NearDuplicateIndex()
+        self.checked = 0
+        self.duplicates = 0
+        self._shared = shared
+        self._synced_at = 0.0
+
+    async def init(self):
+        """Create the table, forget the fingerprints outside the window and load the rest into memory."""
+        async with db.transaction() as transaction:
+            await transaction.execute("""
+                CREATE TABLE IF NOT EXISTS story_fingerprints (
+                    article_key CHAR(40) PRIMARY KEY,
+                    fingerprint BIGINT NOT NULL,
+                    seen_at DOUBLE PRECISION NOT NULL
+                );
+            """)
+            await transaction.execute("""
+                CREATE INDEX IF NOT EXISTS story_fingerprints_seen_at_idx ON story_fingerprints (seen_at);
+            """)
+            self._synced_at = time.time()
+            await transaction.execute("DELETE FROM story_fingerprints WHERE seen_at < %s;",
+                                      (self._synced_at - NEAR_DUP_WINDOW,))
+            rows = await transaction.fetchall("SELECT article_key, fingerprint, seen_at FROM story_fingerprints;")
+        for key, fingerprint, seen_at in rows:
+            self.index.add(key, _to_unsigned(fingerprint), seen_at)
+        logger.info("Loaded %d story fingerprints", len(rows))
+
+    async def _sync(self):
+        """Add the fingerprints stored by the other workers since the last sync to the index."""
+        since, self._synced_at = self._synced_at - SYNC_OVERLAP, time.time()
+        rows = await db.fetchall("SELECT article_key, fingerprint, seen_at FROM story_fingerprints WHERE seen_at > %s;",
+                                 (since,))
+        for key, fingerprint, seen_at in rows:
+            self.index.add(key, _to_unsigned(fingerprint), seen_at)
+
+    async def claim(self, article: Dict[str, Any]) -> Optional[str]:
+        """
+        Check the article against the recent stories and record it if it is new
+
+        :return: the key of the story the article duplicates, or None if it is new
+        """
+        now = time.time()
+        fingerprint = simhash(article["title"], article.get("content") or "")
+        self.checked += 1
+        if self._shared:
+            await self._sync()
+        duplicate_of = self.index.find(fingerprint, now, exclude_key=article["key"])
+        if duplicate_of is not None:
+            self.duplicates += 1
+            return duplicate_of
+        self.index.add(article["key"], fingerprint, now)
+        if self.checked % 1000 == 0:
+            self.index.prune(now)
+        try:
+            await db.execute("""
+                INSERT INTO story_fingerprints (article_key, fingerprint, seen_at) VALUES (%s, %s, %s)
+                ON CONFLICT (article_key) DO UPDATE SET fingerprint = EXCLUDED.fingerprint, seen_at = EXCLUDED.seen_at;
+            """, (article["key"], _to_signed(fingerprint), now))
+        except Exception as exc:
+            logger.warning("Failed to persist the story fingerprint of '%s': %s", article['title'], exc)
+            return None
+        if self._shared:
+            # Another worker may have stored the same story while this one checked; the earlier of the two is kept
+            await self._sync()
+            duplicate_of = self.index.find(fingerprint, now, exclude_key=article["key"],
+                                           seen_before=(now, article["key"]))
+            if duplicate_of is not None:
+                self.duplicates += 1
+                return duplicate_of
+        return None
+
+
+near_duplicates: NearDuplicateDetector = NearDuplicateDetector()
+metrics.gauge("near_dup_checked", "Articles checked for near-duplicate stories", lambda: near_duplicates.checked)
+metrics.gauge("near_dup_duplicates", "Articles skipped as near-duplicates", lambda: near_duplicates.duplicates)
@@ -0,0 +1,51 @@
+"""
+Process pool for CPU-heavy parsing
+
+Feeds and article pages are parsed in worker processes, so a large page never stalls the downloads, LLM calls and
+sends on the event loop (a thread would still hold the GIL while parsing). The functions run in the workers live in
+tg.parsers, which imports nothing of the bot, and the workers are started without the main module of the parent, so
+they stay small.
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from core.config import PARSE_WORKERS
+from core.logger import logger
+from tg.parsers import WorkerContext
+
+
+class ParserPool:
+    """Runs parsing functions in worker processes; with no workers configured they run in a thread instead"""
+
+    def __init__(self, workers: int = PARSE_WORKERS) -> None:
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned, not forked: the parent runs threads (DB queries, logging) whose locks a fork would copy
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=WorkerContext())
+        return self._executor
+
+    async def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Return the result of function(*args), computed off the event loop"""
+        if not self.workers:
+            return await asyncio.to_thread(function, *args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        except BrokenProcessPool:
+            logger.error("A parser process died, restarting the pool")
+            self.shutdown()
+            raise
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+parser_pool: ParserPool = ParserPool()
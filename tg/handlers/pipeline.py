@@ -0,0 +1,113 @@
+"""
+Staged streaming pipeline
+
+Articles flow through a chain of stages (e.g. scrape -> classify -> summarize -> publish). Stages are connected by
+bounded asyncio queues and every stage runs its own number of workers, so page downloads, LLM calls and Telegram sends
+are limited independently. A full queue blocks the stage that feeds it, which keeps memory flat under bursts.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from core.config import PIPELINE_QUEUE_SIZE
+from core.logger import log_context, logger
+from core.metrics import metrics
+
+Handler = Callable[[Any], Awaitable[Optional[Any]]]
+FinishCallback = Callable[[Any, Optional[Exception]], Awaitable[None]]
+ContextFunction = Callable[[Any], Dict[str, str]]
+
+STAGE_SECONDS = metrics.histogram("pipeline_stage_seconds", "Duration of one attempt of a pipeline stage")
+STAGE_FAILURES = metrics.counter("pipeline_stage_failures_total", "Failed attempts of a pipeline stage")
+ITEMS_FINISHED = metrics.counter("pipeline_items_total", "Items that left the pipeline, by outcome")
+
+
+class Stage:
+    """One step of the pipeline with its input queue and worker count"""
+
+    def __init__(self, name: str, handler: Handler, concurrency: int, queue_size: int) -> None:
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+
+class Pipeline:
+    """
+    Chain of stages connected by bounded queues
+
+    A handler returns the item to pass to the next stage, or None to drop it. A failing handler is retried after
+    `retry_delay` seconds, doubled on every further attempt. `on_finish` is called once for every item that leaves the
+    pipeline: after the last stage, when it is dropped, or with the exception that made a stage fail after all its
+    retries. `context` returns the log_context() fields of an item, which the records of its stages carry.
+    """
+
+    def __init__(self, retries: int = 1, retry_delay: float = 0, on_finish: Optional[FinishCallback] = None,
+                 context: Optional[ContextFunction] = None) -> None:
+        self._stages: List[Stage] = []
+        self._retries = retries
+        self._retry_delay = retry_delay
+        self._on_finish = on_finish
+        self._context = context
+
+    def stage(self, name: str, handler: Handler, concurrency: int = 1,
+              queue_size: int = PIPELINE_QUEUE_SIZE) -> "Pipeline":
+        self._stages.append(Stage(name, handler, concurrency, queue_size))
+        return self
+
+    async def submit(self, item: Any) -> None:
+        """Put an item into the first stage, waiting while its queue is full"""
+        await self._stages[0].queue.put(item)
+
+    async def _finish(self, item: Any, error: Optional[Exception] = None, outcome: str = "done") -> None:
+        ITEMS_FINISHED.inc(outcome="failed" if error is not None else outcome)
+        if self._on_finish is not None:
+            try:
+                await self._on_finish(item, error)
+            except Exception as exc:
+                logger.error("Finishing an item failed. Error: %s", exc)
+
+    async def _attempt(self, stage: Stage, item: Any) -> Optional[Any]:
+        for attempt in range(1, self._retries + 1):
+            try:
+                with STAGE_SECONDS.time(stage=stage.name):
+                    return await stage.handler(item)
+            except Exception as exc:
+                STAGE_FAILURES.inc(stage=stage.name)
+                if attempt == self._retries:
+                    raise
+                logger.error("Stage '%s' failed (attempt %d/%d). Retrying... Error: %s",
+                             stage.name, attempt, self._retries, exc)
+                await asyncio.sleep(self._retry_delay * 2 ** (attempt - 1))
+
+    async def _worker(self, index: int) -> None:
+        stage = self._stages[index]
+        while True:
+            item = await stage.queue.get()
+            with log_context(stage=stage.name, **(self._context(item) if self._context else {})):
+                try:
+                    result = await self._attempt(stage, item)
+                    if result is None:
+                        await self._finish(item, outcome=f"dropped at {stage.name}")
+                    elif index + 1 < len(self._stages):
+                        await self._stages[index + 1].queue.put(result)  # Backpressure: wait for room downstream
+                    else:
+                        await self._finish(result)
+                except Exception as exc:
+                    logger.error("Stage '%s' failed, dropping the item. Error: %s", stage.name, exc)
+                    await self._finish(item, exc)
+                finally:
+                    stage.queue.task_done()
+
+    async def run(self) -> None:
+        """Run the workers of all stages forever"""
+        await asyncio.gather(*(
+            self._worker(index)
+            for index, stage in enumerate(self._stages)
+            for _ in range(stage.concurrency)
+        ))
+
+    async def join(self) -> None:
+        """Wait until every submitted item has left the pipeline"""
+        for stage in self._stages:
+            await stage.queue.join()
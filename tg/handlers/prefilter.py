@@ -0,0 +1,134 @@
+"""
+Local pre-classifier for AI relevance
+
+A CPU-only keyword scorer that settles the obvious cases before the LLM is asked: articles of AI-only feeds and
+articles full of AI vocabulary are accepted, articles without any are rejected. Only the uncertain middle band goes to
+is_article_related_to_ai().
+"""
+
+import math
+import re
+from typing import Dict, Optional
+
+from core.config import PREFILTER_ACCEPT_SCORE, PREFILTER_FEED_TRUST, PREFILTER_REJECT_SCORE
+from core.metrics import metrics
+
+CONTENT_CHARS = 4000  # Only the beginning of the article is scored
+TITLE_WEIGHT = 3.0  # A term in the title counts as much as three mentions in the content
+MAX_MENTIONS = 3  # Mentions of one term in the content beyond this add nothing
+SCORE_SCALE = 3.0  # Raw weight at which the score reaches ~0.63
+# Generic terms together add at most this raw weight (a score of ~0.28), so they can move an article into the band the
+# LLM decides but never get it accepted without AI-specific vocabulary
+GENERIC_MAX_WEIGHT = 1.0
+
+DECISIONS = metrics.counter("prefilter_decisions_total", "Local relevance decisions: accept, reject or ask the LLM")
+
+AI_TERM_WEIGHTS: Dict[str, float] = {
+    # Unambiguous AI vocabulary
+    "ai": 1.0,
+    "a.i.": 1.0,
+    "artificial intelligence": 1.5,
+    "machine learning": 1.5,
+    "deep learning": 1.5,
+    "neural network": 1.5,
+    "neural networks": 1.5,
+    "large language model": 1.5,
+    "large language models": 1.5,
+    "language model": 1.2,
+    "language models": 1.2,
+    "llm": 1.5,
+    "llms": 1.5,
+    "generative ai": 1.5,
+    "genai": 1.5,
+    "gpt": 1.2,
+    "gpt-4": 1.5,
+    "chatgpt": 1.5,
+    "openai": 1.2,
+    "anthropic": 1.2,
+    "deepmind": 1.2,
+    "hugging face": 1.2,
+    "transformer": 1.0,
+    "transformers": 1.0,
+    "diffusion model": 1.5,
+    "stable diffusion": 1.5,
+    "reinforcement learning": 1.5,
+    "computer vision": 1.2,
+    "natural language processing": 1.5,
+    "nlp": 1.2,
+    "chatbot": 1.0,
+    "chatbots": 1.0,
+    "fine-tuning": 1.0,
+    "fine-tune": 1.0,
+    "prompt engineering": 1.2,
+    "embeddings": 0.8,
+    "copilot": 0.8,
+    "llama": 0.8,
+    "gemini": 0.6,
+    "claude": 0.6,
+}
+# Vocabulary that is common in AI articles but also elsewhere
+GENERIC_TERM_WEIGHTS: Dict[str, float] = {
+    "model": 0.3,
+    "models": 0.3,
+    "algorithm": 0.4,
+    "algorithms": 0.4,
+    "dataset": 0.5,
+    "datasets": 0.5,
+    "training": 0.3,
+    "inference": 0.5,
+    "robot": 0.4,
+    "robots": 0.4,
+    "robotics": 0.6,
+    "automation": 0.3,
+    "gpu": 0.4,
+    "gpus": 0.4,
+    "nvidia": 0.4,
+    "agent": 0.3,
+    "agents": 0.3,
+    "prediction": 0.3,
+}
+TERM_WEIGHTS: Dict[str, float] = {**AI_TERM_WEIGHTS, **GENERIC_TERM_WEIGHTS}
+
+_TERMS_PATTERN = re.compile(
+    r"(?<![\w-])(?:"
+    + "|".join(re.escape(term) for term in sorted(TERM_WEIGHTS, key=len, reverse=True))
+    + r")(?![\w-])",
+    re.IGNORECASE,
+)
+
+
+def _weights(text: str) -> Dict[str, int]:
+    mentions: Dict[str, int] = {}
+    for match in _TERMS_PATTERN.finditer(text):
+        term = match.group(0).lower()
+        mentions[term] = mentions.get(term, 0) + 1
+    return mentions
+
+
+def score_article(rss_url: str, title: str, content: str) -> float:
+    """Return the likelihood that the article is related to AI, between 0 and 1"""
+    weights = {term: TITLE_WEIGHT * TERM_WEIGHTS[term] for term in _weights(title)}
+    for term, count in _weights(content[:CONTENT_CHARS]).items():
+        weights[term] = weights.get(term, 0.0) + TERM_WEIGHTS[term] * min(count, MAX_MENTIONS)
+    generic = sum(weight for term, weight in weights.items() if term in GENERIC_TERM_WEIGHTS)
+    raw = sum(weights.values()) - generic + min(generic, GENERIC_MAX_WEIGHT)
+    score = 1 - math.exp(-raw / SCORE_SCALE)
+    return min(max(score + PREFILTER_FEED_TRUST.get(rss_url, 0.0), 0.0), 1.0)
+
+
+def prefilter_article(rss_url: str, title: str, content: str, accept_score: float = PREFILTER_ACCEPT_SCORE,
+                      reject_score: float = PREFILTER_REJECT_SCORE) -> Optional[bool]:
+    """
+    Decide locally whether the article is related to AI
+
+    :return: True or False for a confident verdict, None if the article has to be classified by the LLM
+    """
+    score = score_article(rss_url, title, content)
+    if score >= accept_score:
+        DECISIONS.inc(decision="accept")
+        return True
+    if score <= reject_score:
+        DECISIONS.inc(decision="reject")
+        return False
+    DECISIONS.inc(decision="llm")
+    return None
@@ -0,0 +1,108 @@
+"""
+Telegram publishing queue
+
+A single long-lived publisher task sends the posts of the outbound queue one by one with the bot of the Application, so
+the commands and the posts share one HTTP client and rate limiter (without an Application, e.g. in the benchmarks, it
+creates its own bot from the token). Sends are paced by the AIORateLimiter to the channel limits of Telegram, which
+also waits out flood control, and only the send itself is retried on network errors. A photo post that Telegram
+rejects is sent as a text post instead. The file_id of every uploaded image is remembered, so an image used again is
+not fetched by Telegram a second time.
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Optional
+
+from telegram import Bot, Message
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, NetworkError
+from telegram.ext import AIORateLimiter, ExtBot
+
+from core.config import PUBLISH_QUEUE_SIZE, PUBLISH_RETRIES, PUBLISH_RETRY_DELAY
+from core.logger import logger
+from core.metrics import metrics
+
+FILE_ID_CACHE_SIZE = 1000
+
+SEND_SECONDS = metrics.histogram("telegram_send_seconds", "Duration of a Telegram send, retries included")
+SEND_FAILURES = metrics.counter("telegram_send_failures_total", "Posts that could not be sent")
+
+
+class TelegramPublisher:
+    """Outbound queue of posts for one chat, drained by run()"""
+
+    def __init__(self, token: Optional[str], chat_id: str, queue_size: int = PUBLISH_QUEUE_SIZE) -> None:
+        self._token = token
+        self._chat_id = chat_id
+        self._bot: Optional[Bot] = None
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._file_ids: "OrderedDict[str, str]" = OrderedDict()
+
+    @property
+    def bot(self) -> Bot:
+        if self._bot is None:
+            self._bot = ExtBot(token=self._token, rate_limiter=AIORateLimiter(max_retries=PUBLISH_RETRIES))
+        return self._bot
+
+    @bot.setter
+    def bot(self, bot: Bot) -> None:
+        """Send with the given bot instead of creating one from the token, e.g. one of another Bot API server"""
+        self._bot = bot
+
+    async def publish(self, caption: str, image: Optional[str] = None) -> Message:
+        """Queue a post and wait until it has been sent"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((caption, image, future))
+        return await future
+
+    def _remember_file_id(self, image: str, message: Message) -> None:
+        if message.photo:
+            self._file_ids[image] = message.photo[-1].file_id  # The largest size
+            self._file_ids.move_to_end(image)
+            while len(self._file_ids) > FILE_ID_CACHE_SIZE:
+                self._file_ids.popitem(last=False)
+
+    async def _send(self, caption: str, image: Optional[str]) -> Message:
+        if not image:
+            return await self.bot.send_message(chat_id=self._chat_id, text=caption, parse_mode=ParseMode.HTML)
+        file_id = self._file_ids.get(image)
+        try:
+            message = await self.bot.send_photo(chat_id=self._chat_id, photo=file_id or image, caption=caption,
+                                                parse_mode=ParseMode.HTML)
+        except BadRequest as exc:  # E.g. an image Telegram can't fetch or a caption too long for a photo
+            logger.warning("Telegram rejected the photo post, sending it without the image. Error: %s", exc)
+            return await self.bot.send_message(chat_id=self._chat_id, text=caption, parse_mode=ParseMode.HTML)
+        if file_id is None:
+            self._remember_file_id(image, message)
+        return message
+
+    async def _send_with_retry(self, caption: str, image: Optional[str]) -> Message:
+        for attempt in range(1, PUBLISH_RETRIES + 1):
+            try:
+                return await self._send(caption, image)
+            except BadRequest:
+                raise  # The post itself is rejected, sending it again won't help
+            except NetworkError as exc:  # Also covers TimedOut; flood control is retried by the rate limiter
+                if attempt == PUBLISH_RETRIES:
+                    raise
+                logger.warning("Telegram send failed (attempt %d/%d). Retrying... Error: %s",
+                               attempt, PUBLISH_RETRIES, exc)
+                await asyncio.sleep(PUBLISH_RETRY_DELAY * 2 ** (attempt - 1))
+
+    async def run(self) -> None:
+        """Send the queued posts forever"""
+        await self.bot.initialize()
+        while True:
+            caption, image, future = await self._queue.get()
+            try:
+                with SEND_SECONDS.time():
+                    message = await self._send_with_retry(caption, image)
+            except Exception as exc:
+                SEND_FAILURES.inc()
+                if not future.done():
+                    future.set_exception(exc)
+            else:
+                if not future.done():
+                    future.set_result(message)
+            finally:
+                self._queue.task_done()
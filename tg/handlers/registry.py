@@ -0,0 +1,159 @@
+"""
+In-memory registry of the RSS feeds
+
+The registry is the single source of truth for the feeds: it is read from rss_feeds.json once, every change is
+persisted atomically (temp file + rename) and the subscribers are notified right away, on their own event loop, so a
+new feed is polled immediately and a deleted one stops at once without anybody re-reading the file.
+
+Several workers (FEED_SHARDING) share the feeds in the rss_feeds table instead, seeded from the file on first use. The
+commands change the table and every worker picks the changes up with refresh() before it rebalances its leases.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core import PROJECT_ROOT
+from core.config import FEED_SHARDING
+from core.db import db
+from core.logger import logger
+
+FEEDS_FILE = PROJECT_ROOT.joinpath("rss_feeds.json")
+
+# Called with the feed URL and its name, or None as the name when the feed was deleted
+Subscriber = Callable[[str, Optional[str]], None]
+
+
+class FeedRegistry:
+    """Feeds by URL, kept in memory and persisted to a JSON file"""
+
+    def __init__(self, path: Path = FEEDS_FILE) -> None:
+        self._path = path
+        self._feeds: Optional[Dict[str, str]] = None  # Replaced, never mutated, so readers need no lock
+        self._lock = threading.Lock()  # The bot handlers and the monitor may run on different threads
+        self._subscribers: List[Tuple[Subscriber, asyncio.AbstractEventLoop]] = []
+
+    def feeds(self) -> Dict[str, str]:
+        """Return a snapshot of the feeds by URL"""
+        if self._feeds is None:
+            with self._lock:
+                if self._feeds is None:
+                    with open(self._path, "r") as file:
+                        self._feeds = json.load(file)
+        return dict(self._feeds)
+
+    def __contains__(self, rss_url: str) -> bool:
+        return rss_url in self.feeds()
+
+    def subscribe(self, callback: Subscriber) -> None:
+        """Call `callback` on the running event loop whenever a feed is added or deleted"""
+        self._subscribers.append((callback, asyncio.get_running_loop()))
+
+    def _write(self, feeds: Dict[str, str]) -> None:
+        descriptor, temp_path = tempfile.mkstemp(dir=self._path.parent, prefix=f".{self._path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w") as file:
+                json.dump(feeds, file, indent=2)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self._path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _update(self, rss_url: str, name: Optional[str]) -> bool:
+        self.feeds()  # Make sure the file has been loaded
+        with self._lock:
+            if name is None and rss_url not in self._feeds:
+                return False
+            feeds = dict(self._feeds)
+            if name is None:
+                del feeds[rss_url]
+            else:
+                feeds[rss_url] = name
+            self._write(feeds)
+            self._feeds = feeds
+        return True
+
+    def _notify(self, rss_url: str, name: Optional[str]) -> None:
+        for callback, loop in self._subscribers:
+            loop.call_soon_threadsafe(callback, rss_url, name)
+
+    async def add(self, rss_url: str, name: str) -> None:
+        await asyncio.to_thread(self._update, rss_url, name)
+        logger.info("Added RSS feed %s: %s", name, rss_url)
+        self._notify(rss_url, name)
+
+    async def remove(self, rss_url: str) -> bool:
+        """Delete the feed; False if it is not registered"""
+        if not await asyncio.to_thread(self._update, rss_url, None):
+            return False
+        logger.info("Deleted RSS feed: %s", rss_url)
+        self._notify(rss_url, None)
+        return True
+
+    async def init(self):
+        """Nothing to do, the file is read on first use."""
+
+    async def refresh(self) -> None:
+        """Nothing to do, the file is only changed through this registry"""
+
+
+class SharedFeedRegistry(FeedRegistry):
+    """Feeds by URL in the rss_feeds table, shared by the workers; the snapshot is renewed by refresh()"""
+
+    async def init(self):
+        """Create the table if it doesn't exist, fill it from the feeds file if it is empty and load it."""
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS rss_feeds (
+                rss_url TEXT PRIMARY KEY,
+                name TEXT NOT NULL
+            );
+        """)
+        with open(self._path, "r") as file:
+            seed = json.load(file)
+        await db.execute("""
+            INSERT INTO rss_feeds (rss_url, name)
+            SELECT * FROM unnest(%s::text[], %s::text[]) WHERE NOT EXISTS (SELECT 1 FROM rss_feeds)
+            ON CONFLICT (rss_url) DO NOTHING;
+        """, (list(seed), list(seed.values())))
+        await self.refresh()
+
+    def feeds(self) -> Dict[str, str]:
+        return dict(self._feeds or {})
+
+    async def refresh(self) -> None:
+        """Load the feeds and notify the subscribers of the ones other workers added or deleted"""
+        feeds = dict(await db.fetchall("SELECT rss_url, name FROM rss_feeds;"))
+        previous, self._feeds = self._feeds, feeds
+        if previous is None:
+            return
+        for rss_url in previous.keys() - feeds.keys():
+            self._notify(rss_url, None)
+        for rss_url in feeds.keys() - previous.keys():
+            self._notify(rss_url, feeds[rss_url])
+
+    async def add(self, rss_url: str, name: str) -> None:
+        await db.execute("""
+            INSERT INTO rss_feeds (rss_url, name) VALUES (%s, %s)
+            ON CONFLICT (rss_url) DO UPDATE SET name = EXCLUDED.name;
+        """, (rss_url, name))
+        self._feeds = {**self.feeds(), rss_url: name}
+        logger.info("Added RSS feed %s: %s", name, rss_url)
+        self._notify(rss_url, name)
+
+    async def remove(self, rss_url: str) -> bool:
+        """Delete the feed; False if it is not registered"""
+        if await db.fetchone("DELETE FROM rss_feeds WHERE rss_url = %s RETURNING rss_url;", (rss_url,)) is None:
+            return False
+        self._feeds = {url: name for url, name in self.feeds().items() if url != rss_url}
+        logger.info("Deleted RSS feed: %s", rss_url)
+        self._notify(rss_url, None)
+        return True
+
+
+feed_registry: FeedRegistry = SharedFeedRegistry() if FEED_SHARDING else FeedRegistry()
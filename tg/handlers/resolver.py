@@ -0,0 +1,75 @@
+"""
+Async redirect resolver for aggregated links (e.g. news.google.com)
+
+Redirects are followed hop by hop on the shared aiohttp session without reading any redirect body, and the final
+response is handed to the caller to read the page from, so an aggregated article costs a single page download.
+Resolved targets are kept in an LRU cache with a TTL, so later requests for the same link go straight to the target.
+"""
+
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Tuple
+from urllib.parse import urljoin
+
+from aiohttp import ClientError, ClientResponse, ClientSession
+
+from core.config import RESOLVER_CACHE_SIZE, RESOLVER_CACHE_TTL
+from core.metrics import metrics
+
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 10
+
+
+class RedirectResolver:
+    """Follows redirects to the final page and caches where links lead"""
+
+    def __init__(self, max_entries: int = RESOLVER_CACHE_SIZE, ttl: float = RESOLVER_CACHE_TTL) -> None:
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, url: str) -> Optional[str]:
+        cached = self._cache.get(url)
+        if cached is None or cached[1] < time.monotonic():
+            self._cache.pop(url, None)
+            self.misses += 1
+            return None
+        self._cache.move_to_end(url)
+        self.hits += 1
+        return cached[0]
+
+    def _put(self, url: str, final_url: str) -> None:
+        self._cache[url] = (final_url, time.monotonic() + self._ttl)
+        self._cache.move_to_end(url)
+        while len(self._cache) > self._max_entries:
+            self._cache.popitem(last=False)
+
+    async def _follow(self, session: ClientSession, url: str) -> ClientResponse:
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await session.get(url, allow_redirects=False)
+            location = response.headers.get("Location")
+            if response.status not in REDIRECT_STATUSES or not location:
+                return response
+            response.release()  # Only the Location header of a redirect is needed
+            url = urljoin(url, location)
+        raise ClientError(f"Too many redirects, last location: {url}")
+
+    @asynccontextmanager
+    async def open_final(self, session: ClientSession, url: str) -> AsyncIterator[ClientResponse]:
+        """Yield the unread response of the page the link finally leads to"""
+        response = await self._follow(session, self._get(url) or url)
+        try:
+            final_url = str(response.url)
+            if final_url != url:
+                self._put(url, final_url)
+            yield response
+        finally:
+            response.release()
+
+
+url_resolver: RedirectResolver = RedirectResolver()
+metrics.gauge("resolver_cache_hits", "Links resolved from the redirect cache", lambda: url_resolver.hits)
+metrics.gauge("resolver_cache_misses", "Links whose redirects were followed", lambda: url_resolver.misses)
@@ -0,0 +1,161 @@
+"""
+Adaptive per-feed poll scheduler
+
+Every feed has its own due time in a priority queue. Workers pull the feeds that are due, poll them and put them back
+with an interval derived from the publish cadence observed in the feed, bounded by the configured min/max interval.
+Busy feeds are polled often, quiet feeds almost never, and a slow feed only holds up its own worker.
+"""
+
+import asyncio
+import datetime
+import heapq
+import statistics
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from core.config import (
+    FEED_DEFAULT_POLL_INTERVAL,
+    FEED_MAX_POLL_INTERVAL,
+    FEED_MIN_POLL_INTERVAL,
+    FEED_POLL_WORKERS,
+)
+from core.logger import log_context, logger
+from core.metrics import metrics
+
+CADENCE_HISTORY = 10  # Number of recent publications used to estimate a feed's cadence
+CADENCE_FACTOR = 0.5  # Poll twice per expected publication
+QUIET_BACKOFF = 1.5  # Interval growth after a poll without news, while the cadence is still unknown
+
+POLL_SECONDS = metrics.histogram("feed_poll_seconds", "Duration of a feed poll, up to the articles being queued")
+FEED_ERRORS = metrics.counter("feed_errors_total", "Failed polls per feed")
+
+
+class FeedScheduler:
+    """Priority queue of feeds keyed on their next due time"""
+
+    def __init__(self, min_interval: float = FEED_MIN_POLL_INTERVAL, max_interval: float = FEED_MAX_POLL_INTERVAL,
+                 default_interval: float = FEED_DEFAULT_POLL_INTERVAL) -> None:
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._default_interval = default_interval
+        self._heap: List[Tuple[float, str]] = []
+        self._due: Dict[str, float] = {}  # Feeds waiting in the heap
+        self._polling: Set[str] = set()  # Feeds taken out of the heap by a worker
+        self._feeds: Set[str] = set()
+        self._intervals: Dict[str, float] = {}
+        self._publications: Dict[str, List[datetime.datetime]] = {}
+        self._found_new: Set[str] = set()
+        self._held_until: Dict[str, float] = {}
+        self._changed = asyncio.Event()
+
+    def add(self, rss_url: str, delay: float = 0) -> None:
+        """Register a feed, due after `delay` seconds"""
+        self._feeds.add(rss_url)
+        self._intervals.setdefault(rss_url, self._default_interval)
+        if rss_url not in self._polling:  # A feed being polled is pushed back by reschedule()
+            self._push(rss_url, time.monotonic() + delay)
+
+    def remove(self, rss_url: str) -> None:
+        """Unregister a feed; its heap entry is dropped lazily"""
+        self._feeds.discard(rss_url)
+        self._due.pop(rss_url, None)
+        self._intervals.pop(rss_url, None)
+        self._publications.pop(rss_url, None)
+        self._held_until.pop(rss_url, None)
+
+    def hold(self, rss_url: str, seconds: float) -> None:
+        """Don't poll the feed for `seconds`, e.g. while its circuit breaker is open"""
+        if seconds <= 0:
+            return
+        until = time.monotonic() + seconds
+        self._held_until[rss_url] = until
+        if self._due.get(rss_url, until) < until:
+            self._push(rss_url, until)
+
+    def __contains__(self, rss_url: str) -> bool:
+        return rss_url in self._feeds
+
+    def interval(self, rss_url: str) -> Optional[float]:
+        return self._intervals.get(rss_url)
+
+    def observe(self, rss_url: str, pub_dates: Iterable[datetime.datetime]) -> None:
+        """Record the publication dates seen in a feed, used to estimate its cadence"""
+        history = self._publications.get(rss_url, [])
+        merged = sorted(set(history).union(pub_dates))[-CADENCE_HISTORY:]
+        if history and merged[-1] > history[-1]:
+            self._found_new.add(rss_url)
+        self._publications[rss_url] = merged
+
+    def _cadence(self, rss_url: str) -> Optional[float]:
+        history = self._publications.get(rss_url, [])
+        if len(history) < 2:
+            return None
+        gaps = [(later - earlier).total_seconds() for earlier, later in zip(history, history[1:])]
+        return statistics.median(gaps)
+
+    def _next_interval(self, rss_url: str) -> float:
+        current = self._intervals.get(rss_url, self._default_interval)
+        cadence = self._cadence(rss_url)
+        if cadence is not None:
+            interval = cadence * CADENCE_FACTOR
+        elif rss_url in self._found_new:
+            interval = current
+        else:
+            interval = current * QUIET_BACKOFF
+        self._found_new.discard(rss_url)
+        return min(max(interval, self._min_interval), self._max_interval)
+
+    def _push(self, rss_url: str, due: float) -> None:
+        self._due[rss_url] = due
+        heapq.heappush(self._heap, (due, rss_url))
+        self._changed.set()
+
+    def reschedule(self, rss_url: str) -> None:
+        """Put a polled feed back into the queue with its adapted interval"""
+        self._polling.discard(rss_url)
+        if rss_url not in self._feeds:
+            return
+        interval = self._next_interval(rss_url)
+        self._intervals[rss_url] = interval
+        due = max(time.monotonic() + interval, self._held_until.pop(rss_url, 0.0))
+        logger.debug("Next poll of %s in %.0fs", rss_url, due - time.monotonic())
+        self._push(rss_url, due)
+
+    async def next_due(self) -> str:
+        """Wait for the next due feed and take it out of the queue until it is rescheduled"""
+        while True:
+            while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)  # Stale entry of a removed or already rescheduled feed
+            timeout = None
+            if self._heap:
+                due, rss_url = self._heap[0]
+                timeout = due - time.monotonic()
+                if timeout <= 0:
+                    heapq.heappop(self._heap)
+                    del self._due[rss_url]
+                    self._polling.add(rss_url)
+                    return rss_url
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self, poll: Callable[[str], Awaitable[None]]) -> None:
+        while True:
+            rss_url = await self.next_due()
+            try:
+                with POLL_SECONDS.time(), log_context(feed=rss_url):
+                    await poll(rss_url)
+            except Exception as exc:
+                FEED_ERRORS.inc(feed=rss_url)
+                logger.error("Error polling RSS URL %s: %s", rss_url, exc)
+            finally:
+                self.reschedule(rss_url)
+
+    async def run(self, poll: Callable[[str], Awaitable[None]], workers: int = FEED_POLL_WORKERS) -> None:
+        """Poll due feeds forever with `workers` concurrent workers"""
+        await asyncio.gather(*(self._worker(poll) for _ in range(workers)))
+
+
+feed_scheduler: FeedScheduler = FeedScheduler()
@@ -0,0 +1,97 @@
+"""
+Summary of the metrics for the /stats admin command
+
+Reads the metrics registry and condenses it into a short HTML message: latency percentiles per pipeline stage and
+external call, token usage, hit rates of the caches and deduplication, and the feeds with the most errors.
+"""
+
+import html
+from typing import Dict, List, Optional
+
+from core.metrics import Counter, Histogram, metrics
+
+TOP_FEED_ERRORS = 5
+
+
+def _histogram(name: str) -> Optional[Histogram]:
+    metric = metrics.get(name)
+    return metric if isinstance(metric, Histogram) else None
+
+
+def _counter(name: str) -> Optional[Counter]:
+    metric = metrics.get(name)
+    return metric if isinstance(metric, Counter) else None
+
+
+def _gauge(name: str) -> float:
+    metric = metrics.get(name)
+    return metric.read() if metric is not None else 0
+
+
+def _latency(histogram: Optional[Histogram], **labels: str) -> str:
+    if histogram is None:
+        return "no data"
+    p50, p99 = histogram.quantile(0.5, **labels), histogram.quantile(0.99, **labels)
+    if p50 is None:
+        return "no data"
+    return f"{histogram.count(**labels)}×, p50 {p50:.2f}s, p99 {p99:.2f}s"
+
+
+def _rate(part: float, total: float) -> str:
+    return f"{part / total:.0%}" if total else "n/a"
+
+
+def _counts(counter: Optional[Counter], label: str) -> Dict[str, float]:
+    if counter is None:
+        return {}
+    return {dict(labels).get(label, ""): value for labels, value in list(counter.values.items())}
+
+
+def render_stats() -> str:
+    lines: List[str] = ["<b>Pipeline</b>"]
+    stages = _histogram("pipeline_stage_seconds")
+    failures = _counts(_counter("pipeline_stage_failures_total"), "stage")
+    for labels in list(stages.series) if stages else []:
+        stage = dict(labels)["stage"]
+        lines.append(f"{stage}: {_latency(stages, stage=stage)}, {failures.get(stage, 0):.0f} failed attempts")
+    outcomes = _counts(_counter("pipeline_items_total"), "outcome")
+    lines.append(", ".join(f"{outcome}: {count:.0f}" for outcome, count in sorted(outcomes.items())) or "no items yet")
+
+    lines.append("\n<b>Feeds</b>")
+    lines.append(f"polls: {_latency(_histogram('feed_poll_seconds'))}")
+    fetches = _histogram("feed_fetch_seconds")
+    fetched = fetches.count() if fetches else 0
+    not_modified = _counter("feed_not_modified_total")
+    not_modified_rate = _rate(not_modified.total() if not_modified else 0, fetched)
+    lines.append(f"fetches: {_latency(fetches)}, not modified {not_modified_rate}")
+    errors = sorted(_counts(_counter("feed_errors_total"), "feed").items(), key=lambda item: -item[1])
+    for feed, count in errors[:TOP_FEED_ERRORS]:
+        lines.append(f"{count:.0f} errors: {html.escape(feed)}")
+    lines.append(f"not polled while failing: {_gauge('feeds_circuit_open'):.0f} (see /health)")
+
+    lines.append("\n<b>LLM</b>")
+    requests, waits = _histogram("llm_request_seconds"), _histogram("llm_slot_wait_seconds")
+    tokens = _counts(_counter("llm_tokens_total"), "call")
+    for call in ("classify", "summary"):
+        lines.append(f"{call}: {_latency(requests, call=call)}, {tokens.get(call, 0):.0f} tokens, "
+                     f"slot wait {_latency(waits, call=call)}")
+    hits, misses = _gauge("llm_cache_hits"), _gauge("llm_cache_misses")
+    lines.append(f"cache hit rate: {_rate(hits, hits + misses)}")
+    decisions = _counts(_counter("prefilter_decisions_total"), "decision")
+    lines.append(f"prefilter: {_rate(decisions.get('accept', 0) + decisions.get('reject', 0), sum(decisions.values()))}"
+                 f" decided locally")
+
+    lines.append("\n<b>Deduplication</b>")
+    skipped = _counter("ledger_already_processed_total")
+    lines.append(f"already processed entries: {skipped.total() if skipped else 0:.0f}")
+    checked, duplicates = _gauge("near_dup_checked"), _gauge("near_dup_duplicates")
+    lines.append(f"near-duplicates: {duplicates:.0f} of {checked:.0f} ({_rate(duplicates, checked)})")
+    hits, misses = _gauge("resolver_cache_hits"), _gauge("resolver_cache_misses")
+    lines.append(f"redirect cache hit rate: {_rate(hits, hits + misses)}")
+
+    lines.append("\n<b>Telegram and database</b>")
+    send_failures = _counter("telegram_send_failures_total")
+    lines.append(f"sends: {_latency(_histogram('telegram_send_seconds'))}, "
+                 f"{send_failures.total() if send_failures else 0:.0f} failed")
+    lines.append(f"transactions: {_latency(_histogram('db_transaction_seconds'))}")
+    return "\n".join(lines)
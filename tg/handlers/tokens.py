@@ -0,0 +1,39 @@
+"""
+Token budgets for LLM prompts
+
+The tiktoken encoder is loaded once per process. Content sent to the LLM is trimmed to the budget of its call type, and
+content that is too long to summarize in one request is split into chunks for map-reduce summarization, so the size
+of every request has a fixed upper bound.
+"""
+
+from functools import lru_cache
+from typing import List
+
+import tiktoken
+
+ENCODING_NAME = 'cl100k_base'
+
+
+@lru_cache(maxsize=None)
+def get_encoder() -> tiktoken.Encoding:
+    return tiktoken.get_encoding(ENCODING_NAME)
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoder().encode(text, disallowed_special=()))
+
+
+def truncate_to_budget(text: str, budget: int) -> str:
+    """Return the beginning of the text that fits into `budget` tokens"""
+    encoder = get_encoder()
+    tokens = encoder.encode(text, disallowed_special=())
+    if len(tokens) <= budget:
+        return text
+    return encoder.decode(tokens[:budget])
+
+
+def split_to_budget(text: str, budget: int) -> List[str]:
+    """Split the text into consecutive chunks of at most `budget` tokens each"""
+    encoder = get_encoder()
+    tokens = encoder.encode(text, disallowed_special=())
+    return [encoder.decode(tokens[start:start + budget]) for start in range(0, len(tokens), budget)]
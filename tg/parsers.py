@@ -0,0 +1,171 @@
+"""
+Parsing functions of the parser pool
+
+The feeds and the article pages are parsed by these functions in the worker processes of tg.handlers.parsing. The
+module only depends on the parsing libraries, so a spawned worker imports nothing of the bot (Telegram, the database,
+the logging listener) to run them. They return compact results only: the title, link, GUID and dates of the feed
+entries, or the text and lead image of a page, never the parsed feed or document. The workers are started through
+WorkerContext, also defined here, since a spawned worker imports the module of its process class.
+
+Pages are handed to a streaming HTML parser, so no DOM tree is ever built: the largest block of consecutive long
+paragraphs is tracked in a single linear pass, and the lead image is taken from og:image / twitter:image, falling back
+to the lead figure of the page.
+"""
+
+import datetime
+import sys
+import types
+from html.parser import HTMLParser
+from multiprocessing.context import SpawnContext, SpawnProcess
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import feedparser
+import pytz
+from dateutil import parser
+
+ENTRY_FIELDS = ("id", "title", "link", "published")
+MIN_PARAGRAPH_CHARS = 50  # Shorter paragraphs end a text block
+SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+IMAGE_META_PRIORITY = ("og:image", "og:image:url", "og:image:secure_url", "twitter:image", "twitter:image:src")
+
+
+def parse_pub_date(pub_date_str: str) -> datetime.datetime:
+    if isinstance(pub_date_str, str):
+        parsed_date = parser.parse(pub_date_str)
+    elif isinstance(pub_date_str, datetime.datetime):
+        parsed_date = pub_date_str
+    else:
+        raise ValueError(f"Unexpected type for pub_date_str: {type(pub_date_str)}")
+
+    # Convert the parsed date to UTC timezone
+    parsed_date_utc = parsed_date.astimezone(pytz.utc)
+    return parsed_date_utc
+
+
+def parse_feed(body: bytes, response_headers: Mapping[str, str]) -> List[Dict[str, Any]]:
+    """
+    Parse the feed and return its entries with only the fields the bot uses
+
+    :return: dicts with the id, title, link and published fields present in the entry, and the published date
+        parsed to UTC under pub_date (None if the entry has none or it is malformed)
+    """
+    feed = feedparser.parse(body, response_headers=dict(response_headers))
+    entries = []
+    for entry in feed.entries:
+        compact = {field: entry[field] for field in ENTRY_FIELDS if field in entry}
+        try:
+            compact["pub_date"] = parse_pub_date(entry.published) if "published" in entry else None
+        except (ValueError, OverflowError):  # One malformed date must not fail the whole feed
+            compact["pub_date"] = None
+        entries.append(compact)
+    return entries
+
+
+class ArticleExtractor(HTMLParser):
+    """Incremental parser that keeps only the largest text block and the lead image candidates"""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self._skip_depth = 0
+        self._paragraph: Optional[List[str]] = None
+        self._block: List[str] = []
+        self._block_chars = 0
+        self._largest: List[str] = []
+        self._largest_chars = 0
+        self._image_meta: Dict[str, str] = {}
+        self._in_lead_figure = False
+        self._lead_figure_image: Optional[str] = None
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag == "p":
+            self._end_paragraph()  # An unclosed <p> is closed by the next one
+            self._paragraph = []
+        elif tag == "meta":
+            attributes = dict(attrs)
+            name = (attributes.get("property") or attributes.get("name") or "").lower()
+            if name in IMAGE_META_PRIORITY and attributes.get("content"):
+                self._image_meta.setdefault(name, attributes["content"])
+        elif tag == "figure":
+            self._in_lead_figure = "article__lead__image" in (dict(attrs).get("class") or "")
+        elif tag == "img" and self._in_lead_figure and self._lead_figure_image is None:
+            self._lead_figure_image = dict(attrs).get("src")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag == "p":
+            self._end_paragraph()
+        elif tag == "figure":
+            self._in_lead_figure = False
+
+    def handle_data(self, data: str) -> None:
+        if self._paragraph is not None and not self._skip_depth:
+            self._paragraph.append(data)
+
+    def _end_paragraph(self) -> None:
+        if self._paragraph is None:
+            return
+        text = "".join(self._paragraph)
+        self._paragraph = None
+        if len(text) > MIN_PARAGRAPH_CHARS:
+            self._block.append(text)
+            self._block_chars += len(text) + 1
+        else:
+            self._end_block()
+
+    def _end_block(self) -> None:
+        if self._block_chars > self._largest_chars:
+            self._largest, self._largest_chars = self._block, self._block_chars
+        self._block, self._block_chars = [], 0
+
+    def close(self) -> None:
+        super().close()
+        self._end_paragraph()
+        self._end_block()
+
+    @property
+    def content(self) -> str:
+        return "\n".join(self._largest).strip()
+
+    @property
+    def image(self) -> Optional[str]:
+        for name in IMAGE_META_PRIORITY:
+            if name in self._image_meta:
+                return self._image_meta[name]
+        return self._lead_figure_image
+
+
+def extract_from_html(page: str) -> Tuple[str, Optional[str]]:
+    """Return the largest text block and the lead image of a complete HTML page"""
+    extractor = ArticleExtractor()
+    extractor.feed(page)
+    extractor.close()
+    return extractor.content, extractor.image
+
+
+def extract_page(body: bytes, charset: Optional[str]) -> Tuple[str, Optional[str]]:
+    """Decode the page and return its largest text block and lead image; runs in the parser pool"""
+    try:
+        page = body.decode(charset or "utf-8", errors="replace")
+    except LookupError:
+        page = body.decode("utf-8", errors="replace")
+    return extract_from_html(page)
+
+
+class WorkerProcess(SpawnProcess):
+    """Spawned without the main module of the parent, which would import the whole bot into every worker"""
+
+    _bare_main = types.ModuleType("__main__")
+
+    def start(self) -> None:
+        main, sys.modules["__main__"] = sys.modules["__main__"], self._bare_main
+        try:
+            super().start()
+        finally:
+            sys.modules["__main__"] = main
+
+
+class WorkerContext(SpawnContext):
+    Process = WorkerProcess